@@ -0,0 +1,116 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Benchmarks run against a throw-away database: a temporary SQLite file by
+default, or the database given with --database-url (e.g. a scratch Postgres
+database), which is migrated and seeded with a synthetic catalog.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def parser(description, rows=None):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--database-url', help='Database to seed and benchmark (default: a temporary SQLite file).')
+    if rows is not None:
+        parser.add_argument('--rows', type=int, default=rows, help='Number of products to seed.')
+    return parser
+
+
+def setup_django(database_url=None, **settings_overrides):
+    """Configure Django on ``database_url`` and migrate it."""
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.base')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    import django
+    import environ
+    from django.conf import settings
+
+    if database_url is None:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='ddm-bench-'), 'db.sqlite3')
+    settings.DATABASES['default'] = environ.Env.db_url_config(database_url)
+    settings.MEDIA_ROOT = tempfile.mkdtemp(prefix='ddm-bench-media-')
+    settings.QR_CODE_RENDER_BACKEND = 'sync'
+    # No query log, no debug pages: measure what production runs.
+    settings.DEBUG = False
+    for name, value in settings_overrides.items():
+        setattr(settings, name, value)
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return database_url
+
+
+def seed_catalog(products, shops=100, categories=50, batch_size=10000):
+    """
+    Insert a synthetic catalog with plain executemany, bypassing save() (and
+    its per-row slug query) so that millions of rows seed in seconds.
+    """
+    from django.db import connection, transaction
+
+    from shops.models import Category, Product, Shop
+    from users.models import User
+
+    with transaction.atomic():
+        User.objects.bulk_create(
+            User(username=f'bench-{i}', email=f'bench-{i}@example.com', name=f'Shop {i}') for i in range(shops))
+        users = list(User.objects.filter(username__startswith='bench-').order_by('pk'))
+        Shop.objects.bulk_create(
+            Shop(user=user, name=f'Shop {i}', slug=f'shop-{i}', address='Rua')
+            for i, user in enumerate(users))
+        Category.objects.bulk_create(
+            Category(name=f'Category {i}', slug=f'category-{i}') for i in range(categories))
+    shop_ids = list(Shop.objects.order_by('pk').values_list('pk', flat=True))
+    category_ids = list(Category.objects.order_by('pk').values_list('pk', flat=True))
+
+    table = Product._meta.db_table
+    sql = (f'INSERT INTO {table} (shop_id, category_id, name, slug, price, description, qr_code_status) '
+           f'VALUES (%s, %s, %s, %s, %s, %s, %s)')
+    for start in range(0, products, batch_size):
+        rows = [
+            (shop_ids[i % len(shop_ids)], category_ids[(i * 7) % len(category_ids)],
+             f'Product {(i * 7919) % products:07d}', f'product-{i}', Decimal(i % 10000) / 100,
+             'Synthetic product.', 'ready')
+            for i in range(start, min(start + batch_size, products))
+        ]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+    with connection.cursor() as cursor:
+        # Fresh statistics for the query planners (both SQLite and Postgres).
+        cursor.execute('ANALYZE')
+    return shop_ids, category_ids
+
+
+def measure(func, repeat=200):
+    """Run ``func`` ``repeat`` times and return latency percentiles in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return summarize(timings)
+
+
+def summarize(timings):
+    """p50/p99/mean of ``timings``, in milliseconds."""
+    timings = sorted(timings)
+    return {
+        'p50': statistics.median(timings),
+        'p99': timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+        'mean': statistics.fmean(timings),
+    }
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(value)) for value in column) for column in zip(headers, *rows)]
+    for line in [headers, ['-' * width for width in widths]] + [list(row) for row in rows]:
+        print('  '.join(str(value).ljust(width) for value, width in zip(line, widths)))
@@ -0,0 +1,127 @@
+"""
+Catalog reads under many simultaneous connections, for each gunicorn worker
+class of gunicorn.conf.py: sync, gthread, and uvicorn serving config.asgi,
+whose catalog reads are async views (shops.async_views).
+
+Every connection sends one GET /api/v1/products request. With --slow-ms,
+each client stalls that long before it finishes sending its request
+headers, as a slow mobile client would. The server is started on a seeded
+throw-away database.
+
+    python -m benchmarks.concurrency
+    python -m benchmarks.concurrency --connections 1000 --workers 2 --slow-ms 0 200 --worker-classes gthread uvicorn
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import BASE_DIR, parser, print_table, seed_catalog, setup_django, summarize
+
+HOST = '127.0.0.1'
+PATH = '/api/v1/products?page_size=20'
+
+
+def write_settings(directory, databases):
+    path = Path(directory) / 'benchmark_settings.py'
+    path.write_text(
+        'from config.settings.base import *  # noqa\n'
+        f'DATABASES = {databases!r}\n'
+        "ALLOWED_HOSTS = ['*']\n"
+        'DEBUG = False\n'
+        "CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}\n"
+    )
+    return path.stem
+
+
+def server_command(port):
+    return [sys.executable, '-m', 'gunicorn', '--config', str(BASE_DIR / 'gunicorn.conf.py'),
+            '--bind', f'{HOST}:{port}', '--backlog', '4096', '--access-logfile', '/dev/null',
+            '--log-level', 'warning']
+
+
+async def wait_for_server(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(HOST, port)
+        except OSError:
+            await asyncio.sleep(0.1)
+            continue
+        writer.close()
+        return
+    raise SystemExit(f'The server on port {port} did not start.')
+
+
+async def get(port, slow, timeout, path=PATH):
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(HOST, port)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: {HOST}\r\n'.encode())
+        await writer.drain()
+        if slow:
+            await asyncio.sleep(slow)
+        writer.write(b'Accept: application/json\r\nConnection: close\r\n\r\n')
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    if not response.startswith(b'HTTP/1.1 200'):
+        raise ValueError(response[:80])
+    return (time.perf_counter() - start) * 1000
+
+
+async def run_clients(port, connections, slow, timeout):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(get(port, slow, timeout) for _ in range(connections)),
+                                   return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    timings = [result for result in results if isinstance(result, float)]
+    return timings, len(results) - len(timings), elapsed
+
+
+def main():
+    args = parser(__doc__, rows=10000)
+    args.add_argument('--connections', type=int, default=1000)
+    args.add_argument('--workers', type=int, default=2, help='Server worker processes.')
+    args.add_argument('--worker-classes', nargs='+', default=['sync', 'gthread', 'uvicorn'])
+    args.add_argument('--slow-ms', type=int, nargs='+', default=[0, 200])
+    args.add_argument('--timeout', type=float, default=60, help='Per request timeout, in seconds.')
+    args.add_argument('--port', type=int, default=8765)
+    options = args.parse_args()
+    setup_django(options.database_url)
+
+    from django.conf import settings
+
+    print(f'Seeding {options.rows} products...')
+    seed_catalog(options.rows)
+    settings_directory = tempfile.mkdtemp(prefix='ddm-bench-settings-')
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=write_settings(settings_directory, settings.DATABASES),
+               PYTHONPATH=os.pathsep.join([str(BASE_DIR), settings_directory]))
+
+    rows = []
+    for worker_class in options.worker_classes:
+        server = subprocess.Popen(server_command(options.port), cwd=BASE_DIR,
+                                  env=dict(env, GUNICORN_WORKER_CLASS=worker_class,
+                                           WEB_CONCURRENCY=str(options.workers)))
+        try:
+            asyncio.run(wait_for_server(options.port))
+            for slow_ms in options.slow_ms:
+                timings, errors, elapsed = asyncio.run(
+                    run_clients(options.port, options.connections, slow_ms / 1000, options.timeout))
+                latency = summarize(timings) if timings else {'p50': float('nan'), 'p99': float('nan')}
+                rows.append([worker_class, slow_ms, f'{len(timings) / elapsed:.0f}', f"{latency['p50']:.0f}",
+                             f"{latency['p99']:.0f}", errors])
+        finally:
+            server.terminate()
+            server.wait()
+
+    print()
+    print_table(['worker class', 'client stall (ms)', 'requests/s', 'p50 (ms)', 'p99 (ms)', 'errors'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+GET /api/v1/shops latency with a new database connection per request,
+persistent connections (CONN_MAX_AGE), with and without health checks, and
+through pgbouncer when --pgbouncer-url is given.
+
+The requests go through a gunicorn server (gunicorn.conf.py, one worker):
+Django's test client never closes connections between requests.
+
+    python -m benchmarks.connections
+    python -m benchmarks.connections --database-url postgres://localhost/bench \\
+        --pgbouncer-url postgres://localhost:6432/bench --requests 2000
+"""
+import asyncio
+import os
+import subprocess
+import tempfile
+
+from benchmarks.common import BASE_DIR, parser, print_table, seed_catalog, setup_django, summarize
+from benchmarks.concurrency import HOST, get, server_command, wait_for_server, write_settings
+
+PATH = '/api/v1/shops'
+
+
+async def run_clients(port, requests, concurrency):
+    timings = []
+
+    async def client():
+        while len(timings) < requests:
+            timings.append(await get(port, 0, 30, path=PATH))
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return timings
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--pgbouncer-url', help='The same database through pgbouncer (transaction pooling).')
+    args.add_argument('--requests', type=int, default=1000)
+    args.add_argument('--concurrency', type=int, default=4, help='Simultaneous clients.')
+    args.add_argument('--port', type=int, default=8765)
+    options = args.parse_args()
+    setup_django(options.database_url)
+
+    import environ
+    from django.conf import settings
+
+    seed_catalog(0)
+    database = settings.DATABASES['default']
+    modes = [
+        ('connection per request', database, {'CONN_MAX_AGE': 0}),
+        ('persistent', database, {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': False}),
+        ('persistent + health checks', database, {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True}),
+    ]
+    if options.pgbouncer_url:
+        bouncer = environ.Env.db_url_config(options.pgbouncer_url)
+        modes += [
+            ('pgbouncer, connection per request', bouncer, {'CONN_MAX_AGE': 0, 'DISABLE_SERVER_SIDE_CURSORS': True}),
+            ('pgbouncer, persistent + health checks', bouncer,
+             {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True, 'DISABLE_SERVER_SIDE_CURSORS': True}),
+        ]
+
+    rows = []
+    for name, database, connection_options in modes:
+        settings_directory = tempfile.mkdtemp(prefix='ddm-bench-settings-')
+        module = write_settings(settings_directory, {'default': dict(database, **connection_options)})
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=module, WEB_CONCURRENCY='1',
+                   PYTHONPATH=os.pathsep.join([str(BASE_DIR), settings_directory]))
+        server = subprocess.Popen(server_command(options.port), cwd=BASE_DIR, env=env)
+        try:
+            asyncio.run(wait_for_server(options.port))
+            # Warm up the worker (imports, first connection).
+            asyncio.run(run_clients(options.port, 50, options.concurrency))
+            latency = summarize(asyncio.run(run_clients(options.port, options.requests, options.concurrency)))
+        finally:
+            server.terminate()
+            server.wait()
+        rows.append([name, f"{latency['p50']:.2f}", f"{latency['p99']:.2f}"])
+
+    print()
+    print(f'GET {PATH} on {HOST}, {options.concurrency} clients')
+    print_table(['', 'p50 (ms)', 'p99 (ms)'], rows)
+
+
+if __name__ == '__main__':
+    main()
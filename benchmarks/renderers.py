@@ -0,0 +1,65 @@
+"""
+GET /api/v1/products with DRF's JSONRenderer against the orjson renderer,
+and the encoding alone of a list of serialized products.
+
+    python -m benchmarks.renderers
+    python -m benchmarks.renderers --page-sizes 50 500 --repeat 100
+"""
+import time
+
+from benchmarks.common import measure, parser, print_table, seed_catalog, setup_django, summarize
+
+
+def main():
+    args = parser(__doc__, rows=10000)
+    args.add_argument('--page-sizes', type=int, nargs='+', default=[50, 500])
+    args.add_argument('--repeat', type=int, default=100)
+    options = args.parse_args()
+    # No response cache, every request renders.
+    setup_django(options.database_url, ALLOWED_HOSTS=['testserver'], CATALOG_MAX_PAGE_SIZE=options.rows,
+                 CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.test import APIClient
+
+    from shops.renderers import ORJSONRenderer, orjson
+    from shops.views import ProductViewSet
+
+    if orjson is None:
+        raise SystemExit('orjson is not installed, the renderer would fall back to JSONRenderer.')
+    print(f'Seeding {options.rows} products...')
+    seed_catalog(options.rows)
+    client = APIClient()
+
+    def get(page_size):
+        response = client.get(f'/api/v1/products?page_size={page_size}', HTTP_ACCEPT='application/json')
+        assert response.status_code == 200
+        return response.content
+
+    rows = []
+    for page_size in options.page_sizes + [options.rows]:
+        # Interleaved, so that both renderers see the same process state.
+        timings = {JSONRenderer: [], ORJSONRenderer: []}
+        for _ in range(options.repeat):
+            for renderer, renderer_timings in timings.items():
+                ProductViewSet.renderer_classes = [renderer]
+                start = time.perf_counter()
+                get(page_size)
+                renderer_timings.append((time.perf_counter() - start) * 1000)
+        before, after = summarize(timings[JSONRenderer]), summarize(timings[ORJSONRenderer])
+        rows.append([f'GET page_size={page_size}', f"{before['p50']:.2f}", f"{after['p50']:.2f}"])
+
+    ProductViewSet.renderer_classes = [JSONRenderer]
+    data = client.get(f'/api/v1/products?page_size={options.rows}').json()
+    if JSONRenderer().render(data) != ORJSONRenderer().render(data):
+        raise SystemExit('Renderers disagree.')
+    before = measure(lambda: JSONRenderer().render(data), repeat=options.repeat)
+    after = measure(lambda: ORJSONRenderer().render(data), repeat=options.repeat)
+    rows.append([f'render {options.rows} products', f"{before['p50']:.2f}", f"{after['p50']:.2f}"])
+
+    print()
+    print_table(['', 'JSONRenderer p50 (ms)', 'ORJSONRenderer p50 (ms)'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+List serialization through the model serializers against the value rows of
+shops.values.ValuesSerializer, from the query to the rendered JSON.
+
+    python -m benchmarks.serializers
+    python -m benchmarks.serializers --sizes 1000 10000 100000 --repeat 5
+"""
+from benchmarks.common import measure, parser, print_table, seed_catalog, setup_django
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    args.add_argument('--repeat', type=int, default=5)
+    options = args.parse_args()
+    setup_django(options.database_url, ALLOWED_HOSTS=['testserver'])
+
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from shops.models import Product
+    from shops.serializers import ProductSerializer
+    from shops.values import ValuesSerializer
+
+    print(f'Seeding {max(options.sizes)} products...')
+    seed_catalog(max(options.sizes))
+    context = {'request': Request(APIRequestFactory().get('/api/v1/products')), 'expand': set()}
+    renderer = JSONRenderer()
+
+    def with_serializer(size):
+        products = Product.objects.order_by('name', 'pk')[:size]
+        return renderer.render(ProductSerializer(products, many=True, context=context).data)
+
+    def with_values(size):
+        values = ValuesSerializer(ProductSerializer, context=context)
+        return renderer.render(values.serialize(values.prepare_queryset(Product.objects.order_by('name', 'pk')[:size])))
+
+    rows = []
+    for size in options.sizes:
+        if with_serializer(size) != with_values(size):
+            raise SystemExit(f'Outputs differ at {size} rows.')
+        before = measure(lambda: with_serializer(size), repeat=options.repeat)
+        after = measure(lambda: with_values(size), repeat=options.repeat)
+        rows.append([size, f"{before['p50']:.1f}", f"{after['p50']:.1f}", f"{before['p50'] / after['p50']:.2f}x"])
+
+    print()
+    print_table(['rows', 'ModelSerializer p50 (ms)', 'ValuesSerializer p50 (ms)', 'speedup'], rows)
+
+
+if __name__ == '__main__':
+    main()
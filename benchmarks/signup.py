@@ -0,0 +1,56 @@
+"""
+Signups per second through POST /api/v1/shops, with clients posting
+concurrently from threads (as the threads of a gthread worker would).
+
+    python -m benchmarks.signup
+    python -m benchmarks.signup --signups 100 --concurrency 1 4 8
+"""
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import parser, print_table, setup_django, summarize
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--signups', type=int, default=48, help='Signups per run.')
+    args.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+    options = args.parse_args()
+    setup_django(options.database_url, ALLOWED_HOSTS=['testserver'],
+                 CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+
+    from django.db import connection
+    from rest_framework.test import APIClient
+
+    sequence = itertools.count()
+
+    def signup():
+        n = next(sequence)
+        data = {
+            'user': {'name': f'Shop {n}', 'username': f'signup-{n}', 'email': f'signup-{n}@example.com',
+                     'password': 'a2d4g6j8'},
+            'address': 'Rua',
+        }
+        start = time.perf_counter()
+        response = APIClient().post('/api/v1/shops', data, format='json')
+        elapsed = (time.perf_counter() - start) * 1000
+        assert response.status_code == 201, response.content
+        connection.close()
+        return elapsed
+
+    rows = []
+    for concurrency in options.concurrency:
+        with ThreadPoolExecutor(max_workers=concurrency) as clients:
+            start = time.perf_counter()
+            timings = list(clients.map(lambda _: signup(), range(options.signups)))
+            elapsed = time.perf_counter() - start
+        latency = summarize(timings)
+        rows.append([concurrency, f'{options.signups / elapsed:.1f}',
+                     f"{latency['p50']:.1f}", f"{latency['p99']:.1f}"])
+
+    print_table(['clients', 'signups/s', 'p50 (ms)', 'p99 (ms)'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Concurrent catalog reads and product writes on SQLite: the default rollback
+journal, WAL with the PRAGMAs of config.settings.base.sqlite_pragmas, and
+WAL with the lists read from the readonly alias.
+
+Reader threads page through GET /api/v1/products while writer threads
+rename and reprice products, each save rendering a new QR code.
+
+    python -m benchmarks.sqlite
+    python -m benchmarks.sqlite --readers 8 --writers 2 --seconds 10
+"""
+import os
+import random
+import tempfile
+import threading
+import time
+
+from benchmarks.common import parser, print_table, seed_catalog, setup_django, summarize
+
+
+def main():
+    args = parser(__doc__, rows=10000)
+    args.add_argument('--readers', type=int, default=4)
+    args.add_argument('--writers', type=int, default=2)
+    args.add_argument('--seconds', type=float, default=10)
+    options = args.parse_args()
+    if options.database_url:
+        raise SystemExit('This benchmark only runs on SQLite.')
+
+    rollback_journal = {'journal_mode': 'delete', 'busy_timeout': 5000}
+    path = os.path.join(tempfile.mkdtemp(prefix='ddm-bench-'), 'db.sqlite3')
+    databases = {
+        alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path, 'PRAGMAS': rollback_journal,
+                'TEST': {'MIRROR': None}}
+        for alias in ('default', 'readonly')
+    }
+    # No response cache, every read queries the database.
+    setup_django('sqlite:///' + path, DATABASES=databases, ALLOWED_HOSTS=['testserver'],
+                 CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+
+    from django.conf import settings
+    from django.db import connections
+    from rest_framework.test import APIClient
+
+    from config.settings.base import sqlite_pragmas
+    from shops.models import Product
+
+    print(f'Seeding {options.rows} products...')
+    seed_catalog(options.rows)
+    pks = list(Product.objects.values_list('pk', flat=True))
+
+    modes = [
+        ('rollback journal', rollback_journal, rollback_journal, 'default'),
+        ('WAL + pragmas', sqlite_pragmas(journal_mode='wal'), sqlite_pragmas(journal_mode='wal'), 'default'),
+        ('WAL + pragmas, readonly alias', sqlite_pragmas(journal_mode='wal'),
+         sqlite_pragmas(query_only=True, journal_mode='wal'), 'readonly'),
+    ]
+    rows = []
+    for name, pragmas, read_pragmas, read_database in modes:
+        connections.close_all()
+        connections['default'].settings_dict['PRAGMAS'] = pragmas
+        connections['readonly'].settings_dict['PRAGMAS'] = read_pragmas
+        settings.CATALOG_READ_DATABASE = read_database
+        deadline = time.monotonic() + options.seconds
+        reads, writes, errors = [], [], []
+
+        def reader():
+            client = APIClient()
+            try:
+                while time.monotonic() < deadline:
+                    start = time.perf_counter()
+                    response = client.get('/api/v1/products?page_size=50', HTTP_ACCEPT='application/json')
+                    if response.status_code == 200:
+                        reads.append((time.perf_counter() - start) * 1000)
+                    else:
+                        errors.append(response.status_code)
+            finally:
+                connections.close_all()
+
+        def writer():
+            try:
+                while time.monotonic() < deadline:
+                    start = time.perf_counter()
+                    try:
+                        product = Product.objects.get(pk=random.choice(pks))
+                        product.name = f'Product {random.randrange(10 ** 7):07d}'
+                        product.price = random.randrange(1, 10000) / 100
+                        product.save()
+                    except Exception as exc:  # e.g. "database is locked"
+                        errors.append(exc)
+                        continue
+                    writes.append((time.perf_counter() - start) * 1000)
+            finally:
+                connections.close_all()
+
+        threads = ([threading.Thread(target=reader) for _ in range(options.readers)]
+                   + [threading.Thread(target=writer) for _ in range(options.writers)])
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        read, write = summarize(reads), summarize(writes)
+        rows.append([name, f'{len(reads) / options.seconds:.0f}', f"{read['p50']:.1f}", f"{read['p99']:.1f}",
+                     f'{len(writes) / options.seconds:.0f}', f"{write['p99']:.1f}", len(errors)])
+
+    print()
+    print_table(['', 'reads/s', 'read p50 (ms)', 'read p99 (ms)', 'writes/s', 'write p99 (ms)', 'errors'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,10 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.base')
+# Catalog reads leave Django's single sync thread for a pool of their own,
+# which also writes out the streaming exports and label sheets: Django 3.2
+# would iterate them on the event loop (see shops.async_views).
+os.environ['ASYNC_CATALOG_READS'] = 'true'
 
 application = get_asgi_application()
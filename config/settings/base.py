@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 
@@ -79,13 +80,91 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+
+def sqlite_pragmas(query_only=False, journal_mode=None):
+    """
+    PRAGMAs run on every new SQLite connection (shops.db.apply_pragmas).
+
+    The database is read through mmap and a larger page cache, and writers
+    wait busy_timeout milliseconds for the write lock instead of failing with
+    "database is locked". SQLITE_JOURNAL_MODE=wal lets readers run alongside
+    the writer, synchronous=NORMAL then only syncs at checkpoints (still safe
+    in WAL mode). WAL is opt-in because it is persistent: it is written into
+    the database file, which for the checked-in dev database would show up
+    as a change after any manage.py command.
+    """
+    journal_mode = journal_mode or env('SQLITE_JOURNAL_MODE', default='delete')
+    pragmas = {
+        'journal_mode': journal_mode,
+        'synchronous': 'normal' if journal_mode.lower() == 'wal' else 'full',
+        'mmap_size': env.int('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024),
+        'cache_size': -env.int('SQLITE_CACHE_SIZE_KB', default=64 * 1024),
+        'busy_timeout': env.int('SQLITE_BUSY_TIMEOUT_MS', default=5000),
+    }
+    if query_only:
+        pragmas['query_only'] = 'on'
+    return pragmas
+
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'PRAGMAS': sqlite_pragmas(),
+    },
+    # The same file on connections of their own that can not write, for the
+    # catalog lists when CATALOG_READ_DATABASE=readonly.
+    'readonly': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'PRAGMAS': sqlite_pragmas(query_only=True),
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+
+def database_connection_options(pgbouncer=False):
+    """
+    Connection reuse settings of a DATABASES entry, from the environment.
+
+    CONN_MAX_AGE keeps a connection open for that many seconds across
+    requests (0: one connection per request), CONN_HEALTH_CHECKS checks
+    reused connections once per request (shops.db on Django < 4.1). Behind
+    pgbouncer in transaction pooling mode, server side cursors can not
+    outlive their transaction and are turned off.
+    """
+    options = {
+        'CONN_MAX_AGE': env.int('CONN_MAX_AGE', default=60),
+        'CONN_HEALTH_CHECKS': env.bool('CONN_HEALTH_CHECKS', default=True),
     }
+    if pgbouncer:
+        options['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return options
+
+
+for database in DATABASES.values():
+    database.update(database_connection_options())
+
+# Database alias the catalog lists and exports read from, 'readonly' to keep
+# them off the connections that write.
+CATALOG_READ_DATABASE = env('CATALOG_READ_DATABASE', default='default')
+
+# Caches
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Files shared by the worker processes of a machine by default, so that the
+# catalog invalidations of one process reach the others; several machines
+# need a shared server (CACHE_URL=memcache://... or rediscache://...). A
+# process-local backend (locmemcache://) only suits a single process.
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='filecache://' + os.path.join(tempfile.gettempdir(), 'ddm-cache')),
 }
 
+# Read-only catalog responses are cached in this cache for up to
+# CATALOG_CACHE_TIMEOUT seconds, and expired by model signals on writes.
+CATALOG_CACHE = 'default'
+CATALOG_CACHE_TIMEOUT = env.int('CATALOG_CACHE_TIMEOUT', default=300)
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -127,6 +206,44 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media/'
 
+# QR codes are rendered after the product is committed, by a local worker pool.
+# Backends: 'thread' (default), 'process' or 'sync' (inline, for debugging).
+QR_CODE_RENDER_BACKEND = env('QR_CODE_RENDER_BACKEND', default='thread')
+QR_CODE_RENDER_WORKERS = env.int('QR_CODE_RENDER_WORKERS', default=2)
+
+# Bulk product imports are inserted BULK_IMPORT_CHUNK_SIZE rows at a time, their
+# QR codes rendered across a pool of BULK_IMPORT_RENDER_PROCESSES processes
+# shared by every import (0: inline), or inline when a chunk misses fewer than
+# BULK_IMPORT_INLINE_RENDERS of them.
+BULK_IMPORT_CHUNK_SIZE = env.int('BULK_IMPORT_CHUNK_SIZE', default=500)
+BULK_IMPORT_RENDER_PROCESSES = env.int('BULK_IMPORT_RENDER_PROCESSES', default=os.cpu_count() or 1)
+BULK_IMPORT_INLINE_RENDERS = env.int('BULK_IMPORT_INLINE_RENDERS', default=8)
+
+# Label sheets (many QR codes in one PDF) are composed by LABEL_SHEET_WORKERS
+# threads while products are read LABEL_SHEET_CHUNK_SIZE rows at a time.
+LABEL_SHEET_WORKERS = env.int('LABEL_SHEET_WORKERS', default=4)
+LABEL_SHEET_CHUNK_SIZE = env.int('LABEL_SHEET_CHUNK_SIZE', default=500)
+
+# Catalog reads served by async views (shops.async_views), running on a pool
+# of ASYNC_READ_WORKERS threads while the event loop holds the idle
+# connections. Only useful under ASGI, where config/asgi.py always turns it on.
+ASYNC_CATALOG_READS = env.bool('ASYNC_CATALOG_READS', default=False)
+ASYNC_READ_WORKERS = env.int('ASYNC_READ_WORKERS', default=min(32, (os.cpu_count() or 1) + 4))
+
+# Catalog lists (shops, products, categories) are paginated by cursor,
+# clients can ask for up to CATALOG_MAX_PAGE_SIZE rows with ?page_size=.
+CATALOG_PAGE_SIZE = env.int('CATALOG_PAGE_SIZE', default=50)
+CATALOG_MAX_PAGE_SIZE = env.int('CATALOG_MAX_PAGE_SIZE', default=500)
+# Product search index: 'auto' uses the database's full-text search (SQLite
+# FTS5, Postgres tsvector) and falls back to an in-memory index ('memory').
+PRODUCT_SEARCH_BACKEND = env('PRODUCT_SEARCH_BACKEND', default='auto')
+# Serve the shop facets from the ShopCategorySummary table, kept up to date on
+# every product write, instead of aggregating the products per request. Run
+# `manage.py rebuild_shop_facets` after turning it on.
+SHOP_FACETS_SUMMARY = env.bool('SHOP_FACETS_SUMMARY', default=False)
+# Full exports are streamed, fetching and encoding this many rows at a time.
+CATALOG_EXPORT_CHUNK_SIZE = env.int('CATALOG_EXPORT_CHUNK_SIZE', default=2000)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -174,6 +291,16 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
+    # orjson backed JSON, falling back to DRF's own encoder when not installed.
+    'DEFAULT_RENDERER_CLASSES': (
+        'shops.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'shops.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
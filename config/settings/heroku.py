@@ -7,4 +7,12 @@ SECRET_KEY = env('SECRET_KEY', default='secret')
 ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', default=['*'])
 DATABASES = {
     'default': env.db(),
-}
\ No newline at end of file
+}
+# DATABASE_PGBOUNCER: DATABASE_URL points at a pgbouncer (e.g. the Heroku
+# pgbouncer buildpack) pooling in transaction mode.
+DATABASES['default'].update(database_connection_options(pgbouncer=env.bool('DATABASE_PGBOUNCER', default=False)))
+# The gunicorn workers of a dyno share the file cache, several dynos need a
+# cache server (CACHE_URL=memcache://... or rediscache://...).
+CACHES = {
+    'default': env.cache('CACHE_URL', default='filecache:///tmp/ddm-cache'),
+}
@@ -0,0 +1,76 @@
+"""
+Gunicorn configuration, read from the working directory by ``gunicorn``.
+
+Workers and threads derive from the CPU count and can be overridden with:
+
+    WEB_CONCURRENCY         worker processes
+    GUNICORN_WORKER_CLASS   gthread (default), sync or uvicorn (config.asgi,
+                            with the async catalog reads of shops.async_views)
+    GUNICORN_THREADS        threads per gthread worker
+    GUNICORN_MAX_REQUESTS   requests served before a worker is recycled (0: never)
+    GUNICORN_TIMEOUT        seconds before a silent worker is killed
+    PORT                    port to bind, on all interfaces
+"""
+import multiprocessing
+import os
+
+cpus = multiprocessing.cpu_count()
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+
+if worker_class == 'uvicorn':
+    wsgi_app = 'config.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    # One event loop per core, the reads run on its ASYNC_READ_WORKERS threads.
+    workers = int(os.environ.get('WEB_CONCURRENCY', cpus))
+elif worker_class == 'gthread':
+    wsgi_app = 'config.wsgi:application'
+    # Catalog reads mostly wait on the database and the cache, threads cover
+    # them; QR codes are rendered off the request (QR_CODE_RENDER_BACKEND).
+    workers = int(os.environ.get('WEB_CONCURRENCY', cpus))
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+else:
+    wsgi_app = 'config.wsgi:application'
+    workers = int(os.environ.get('WEB_CONCURRENCY', cpus * 2 + 1))
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+# The app is imported once in the master and the workers share its pages.
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+# Recycled workers give back what the in-process caches (QR codes, search
+# index, responses) and fragmentation grew; the jitter keeps them from
+# restarting all at once.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+accesslog = '-'
+errorlog = '-'
+if os.path.isdir('/dev/shm'):
+    # The heartbeat file off the (possibly disk backed) /tmp.
+    worker_tmp_dir = '/dev/shm'
+
+
+def pre_fork(server, worker):
+    # With preload_app the workers inherit the master's database and cache
+    # connections (e.g. opened by an import time query); sockets shared
+    # between processes interleave their traffic, the master closes them
+    # before forking and each worker opens its own.
+    from django.core.cache import caches
+    from django.db import connections
+
+    connections.close_all()
+    for cache in caches.all():
+        cache.close()
+
+
+# Connections still inherited by a worker, kept referenced: closing them, even
+# by garbage collection, would end the master's session on the shared socket.
+inherited_connections = []
+
+
+def post_fork(server, worker):
+    # Only Django's state is reset, the worker connects on first use.
+    from django.db import connections
+
+    for connection in connections.all():
+        if connection.connection is not None:
+            inherited_connections.append(connection.connection)
+            connection.connection = None
@@ -0,0 +1,101 @@
+"""
+Async entry points of the catalog reads, for ASGI servers (uvicorn, daphne).
+They are used when ASYNC_CATALOG_READS is on, as config/asgi.py sets it.
+
+Under ASGI, Django 3.2 runs every sync view on one shared thread, one
+request at a time, and it has no async ORM. The wrapped read endpoints
+instead run their view (queries, serialization and rendering included) on
+a pool of ASYNC_READ_WORKERS threads. Meanwhile the event loop keeps
+serving the other connections, however slowly their clients read or
+write. Writes keep Django's default thread, and with it its transaction
+guarantees.
+
+Django 3.2 iterates streaming bodies on the event loop, where the queries
+of the exports and label sheets would raise SynchronousOnlyOperation (after
+the headers went out) and their rendering would block every connection.
+Their bodies are written to a temporary file on the read pool instead,
+then sent from it.
+"""
+import asyncio
+import functools
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.http import FileResponse
+
+from shops.db import NEEDS_HEALTH_CHECKS, check_connections
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Spooled bodies up to this size stay in memory.
+SPOOL_MEMORY_SIZE = 1024 * 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_read_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.ASYNC_READ_WORKERS, thread_name_prefix='catalog-read')
+        return _executor
+
+
+def spool(response):
+    """The body of the streaming ``response`` written out by this thread, as a FileResponse."""
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_SIZE)
+    try:
+        for chunk in response:
+            body.write(chunk)
+    finally:
+        response.close()
+    length = body.tell()
+    body.seek(0)
+    spooled = FileResponse(body, status=response.status_code, content_type=response['Content-Type'])
+    for header, value in response.items():
+        spooled[header] = value
+    spooled['Content-Length'] = length
+    return spooled
+
+
+def run_read(view, request, *args, **kwargs):
+    if NEEDS_HEALTH_CHECKS:
+        check_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            # Rendered here, off the event loop.
+            response.render()
+        if response.streaming and not isinstance(response, FileResponse):
+            response = spool(response)
+        return response
+    finally:
+        # The pool threads see no request_started/finished signals, they
+        # close (or keep, per CONN_MAX_AGE) their own connections.
+        close_old_connections()
+
+
+def async_read_view(view):
+    """
+    ``view`` (e.g. a ViewSet's ``as_view()``) as an async view running its
+    reads on the read pool, when ASYNC_CATALOG_READS is on; ``view`` itself
+    otherwise, WSGI workers gaining nothing from the event loop hop.
+    """
+    if not settings.ASYNC_CATALOG_READS:
+        return view
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in READ_METHODS or not isinstance(request, ASGIRequest):
+            # Under WSGI the request thread already is the worker's own.
+            return await sync_to_async(view)(request, *args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_read_executor(),
+                                          functools.partial(run_read, view, request, *args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,219 @@
+import codecs
+import csv
+import json
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from autoslug.utils import crop_slug
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.exceptions import UnsupportedMediaType
+
+from shops.cache_tags import invalidate_counters, shop_slugs
+from shops.counters import rebuild_counters
+from shops.facets import count_summary
+from shops.models import Category, Product, Shop
+from shops.qr_cache import get_qr_code_cache
+from shops.rendering import qr_code_file_name, qr_code_key, render_qr_code
+from shops.response_cache import invalidate
+from shops.search import index_product
+from shops.serializers import ProductSerializer
+
+
+class RowError(Exception):
+    pass
+
+
+def iter_rows(request):
+    """
+    Yield the products of a bulk import request, one dict per row.
+
+    JSON arrays go through the regular parser, CSV and NDJSON bodies are
+    decoded line by line from the request stream. Rows that can not be
+    decoded are yielded as ``RowError`` instances.
+    """
+    content_type = request.content_type.split(';')[0].strip()
+    if content_type == 'application/json':
+        if not isinstance(request.data, list):
+            raise serializers.ValidationError({'non_field_errors': ['Expected a list of products.']})
+        yield from request.data
+        return
+    if content_type not in ('text/csv', 'application/x-ndjson'):
+        raise UnsupportedMediaType(content_type)
+
+    lines = codecs.iterdecode(request.stream or [], 'utf-8-sig')
+    if content_type == 'text/csv':
+        yield from csv.DictReader(lines)
+        return
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as exc:
+            yield RowError(f'Invalid JSON: {exc}')
+
+
+class PreloadedRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key field resolved from instances fetched once per chunk, not one query per row."""
+
+    def __init__(self, instances, **kwargs):
+        self.instances = instances
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        try:
+            return self.instances[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+def preload(model, rows, field):
+    pks = set()
+    for row in rows:
+        try:
+            pks.add(int(row.get(field)))
+        except (AttributeError, TypeError, ValueError):
+            pass
+    return model.objects.in_bulk(pks)
+
+
+def assign_unique_slugs(products):
+    """
+    Give every product of the batch a slug that is unique in the batch and in
+    the database, the way AutoSlugField would have done one save at a time.
+    """
+    field = Product._meta.get_field('slug')
+
+    def suffixed(base, index):
+        if index == 1:
+            return base
+        tail = f'{field.index_sep}{index}'
+        return base[:field.max_length - len(tail)] + tail
+
+    bases = [field.slugify(crop_slug(field, field.slugify(product.name))) or 'product' for product in products]
+    indexes = [1] * len(products)
+    pending = list(range(len(products)))
+    taken = set()
+    while pending:
+        for i in pending:
+            while suffixed(bases[i], indexes[i]) in taken:
+                indexes[i] += 1
+            products[i].slug = suffixed(bases[i], indexes[i])
+            taken.add(products[i].slug)
+        existing = set(Product.objects.filter(slug__in=[products[i].slug for i in pending])
+                       .values_list('slug', flat=True))
+        pending = [i for i in pending if products[i].slug in existing]
+        for i in pending:
+            indexes[i] += 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool():
+    """
+    The process pool shared by every import, started on first use, or
+    ``None`` to render inline (BULK_IMPORT_RENDER_PROCESSES = 0).
+    """
+    global _pool
+    if not settings.BULK_IMPORT_RENDER_PROCESSES:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=settings.BULK_IMPORT_RENDER_PROCESSES)
+    return _pool
+
+
+def render_qr_codes(products):
+    """
+    Render the QR codes of ``products`` and attach them. Below
+    BULK_IMPORT_INLINE_RENDERS missing codes they are rendered inline, the
+    round trip to the process pool would cost more than it saves.
+    """
+    cache = get_qr_code_cache()
+    keys = [qr_code_key(product.qr_data) for product in products]
+    missing = {}
+    for key, product in dict(zip(keys, products)).items():
+        if not cache.contains(qr_code_file_name(key)):
+            missing[key] = product.qr_data
+    pool = get_render_pool() if len(missing) >= settings.BULK_IMPORT_INLINE_RENDERS else None
+    render = pool.map if pool is not None else map
+    names = {}
+    for key, content in zip(missing, render(render_qr_code, missing.values())):
+        names[key] = cache.save(qr_code_file_name(key), content)
+    for key, product in zip(keys, products):
+        product.qr_code = names.get(key, qr_code_file_name(key))
+        product.qr_code_hash = key
+        product.qr_code_status = Product.QRCodeStatus.READY
+
+
+def import_products(rows, context=None, chunk_size=None):
+    """
+    Validate ``rows`` and render their QR codes chunk by chunk, then insert
+    them in a single transaction, so that the write lock (all of SQLite) is
+    not held while the QR codes render.
+
+    Invalid rows are skipped and reported as ``(row_number, errors)``.
+    Returns the number of created products and the errors.
+    """
+    chunk_size = chunk_size or settings.BULK_IMPORT_CHUNK_SIZE
+    rows = iter(rows)
+    chunks, errors, row_number = [], [], 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        dict_rows = [row for row in chunk if isinstance(row, dict)]
+        serializer = ProductSerializer(context=context)
+        serializer.fields['shop'] = PreloadedRelatedField(preload(Shop, dict_rows, 'shop'),
+                                                          queryset=Shop.objects.all())
+        serializer.fields['category'] = PreloadedRelatedField(preload(Category, dict_rows, 'category'),
+                                                              queryset=Category.objects.all(),
+                                                              allow_null=True, required=False)
+        products = []
+        for row in chunk:
+            row_number += 1
+            if isinstance(row, RowError):
+                errors.append((row_number, {'non_field_errors': [str(row)]}))
+                continue
+            if not isinstance(row, dict):
+                errors.append((row_number, {'non_field_errors': ['Expected an object.']}))
+                continue
+            try:
+                products.append(Product(**serializer.run_validation(row)))
+            except serializers.ValidationError as exc:
+                errors.append((row_number, exc.detail))
+        if products:
+            render_qr_codes(products)
+            chunks.append(products)
+
+    created, groups = 0, {}
+    with transaction.atomic():
+        for products in chunks:
+            assign_unique_slugs(products)
+            Product.objects.bulk_create(products)
+            # bulk_create sends no post_save signal to index the products,
+            # nor returns their ids on every database: they are found by slug.
+            for pk, name, description in (Product.objects.filter(slug__in=[product.slug for product in products])
+                                          .values_list('pk', 'name', 'description')):
+                index_product(pk, name, description)
+            for product in products:
+                groups.setdefault((product.shop_id, product.category_id), []).append(product.price)
+            created += len(products)
+        if created:
+            # bulk_create sends no post_save signal.
+            shop_ids = {shop_id for shop_id, _ in groups}
+            category_ids = {category_id for _, category_id in groups if category_id is not None}
+            invalidate('products', *(f'shop-products:{slug}' for slug in shop_slugs(shop_ids)))
+            rebuild_counters(shop_ids=shop_ids, category_ids=category_ids)
+            invalidate_counters(shop_ids=shop_ids, category_ids=category_ids)
+        if settings.SHOP_FACETS_SUMMARY:
+            for (shop_id, category_id), prices in groups.items():
+                count_summary(shop_id, category_id, *prices)
+    return created, errors
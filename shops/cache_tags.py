@@ -0,0 +1,60 @@
+"""
+Tags of the cached catalog responses (``shops.response_cache``), bumped on
+writes so that only the pages showing the written rows expire:
+
+    shops, shop:{slug}, user-shop:{user_id}   shop lists, details and by user
+    shop-products:{slug}                      the products and facets of a shop
+    products, product:{slug}                  product lists and search, details
+    categories, category:{slug}               category lists and details
+    category-counts                           product counters of the categories
+    users, shop-user:{slug}, user:{user_id}   shop lists, details and by user
+                                              embedding their users (?expand=user)
+
+The tags of an embedded relation are only added to pages expanding it.
+"""
+from shops.response_cache import invalidate
+
+# ?expand= relation -> tags of the embedded rows.
+EXPANDED_SHOP_TAGS = {'user': ('users',)}
+EXPANDED_SHOP_DETAIL_TAGS = {'user': ('shop-user:{slug}',)}
+EXPANDED_USER_SHOP_TAGS = {'user': ('user:{user_id}',)}
+EXPANDED_PRODUCT_TAGS = {'shop': ('shops',), 'category': ('categories', 'category-counts')}
+
+
+def shop_tags(slug, user_id):
+    return ('shops', f'shop:{slug}', f'user-shop:{user_id}')
+
+
+def product_tags(slug, shop_slug=None):
+    tags = ('products', f'product:{slug}')
+    if shop_slug is not None:
+        tags += (f'shop-products:{shop_slug}',)
+    return tags
+
+
+def user_tags(user_id, shop_slugs):
+    """Tags of the pages embedding a user: only those of the shops it owns."""
+    if not shop_slugs:
+        return ()
+    return ('users', f'user:{user_id}', *(f'shop-user:{slug}' for slug in shop_slugs))
+
+
+def shop_slugs(shop_ids):
+    from shops.models import Shop
+
+    return list(Shop.objects.filter(pk__in=shop_ids).values_list('slug', flat=True))
+
+
+def invalidate_counters(shop_ids=(), category_ids=()):
+    """Expire the pages showing the product counters of these shops and categories."""
+    from shops.models import Category, Shop
+
+    tags = set()
+    for slug, user_id in Shop.objects.filter(pk__in=shop_ids).values_list('slug', 'user_id'):
+        tags.update(shop_tags(slug, user_id))
+    category_slugs = list(Category.objects.filter(pk__in=category_ids).values_list('slug', flat=True))
+    if category_slugs:
+        tags.add('category-counts')
+        tags.update(f'category:{slug}' for slug in category_slugs)
+    if tags:
+        invalidate(*tags)
@@ -0,0 +1,71 @@
+from decimal import Decimal
+
+from django.db.models import Case, Count, DecimalField, F, Max, Min, OuterRef, Subquery, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, Least
+
+from shops.models import Category, Product, Shop
+
+# Models holding the counters of their products, and the Product foreign key to them.
+COUNTED = ((Shop, 'shop'), (Category, 'category'))
+
+
+def price_value(price):
+    # Cast, or SQLite binds the Decimal as text and LEAST/GREATEST compare strings.
+    field = DecimalField(max_digits=10, decimal_places=2)
+    return Cast(Value(Decimal(str(price)), output_field=field), field)
+
+
+def aggregate_subquery(field, aggregate):
+    """``aggregate`` of the products of the outer row, as a correlated subquery."""
+    products = Product.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    return Subquery(products.annotate(value=aggregate).values('value'))
+
+
+def count_product(shop_id, category_id, price):
+    """Count a product of ``price`` in its shop and category, in one UPDATE each."""
+    price = price_value(price)
+    for model, field in COUNTED:
+        pk = shop_id if field == 'shop' else category_id
+        if pk is None:
+            continue
+        model.objects.filter(pk=pk).update(
+            product_count=F('product_count') + 1,
+            min_price=Least(Coalesce('min_price', price), price),
+            max_price=Greatest(Coalesce('max_price', price), price),
+        )
+
+
+def uncount_product(shop_id, category_id, price):
+    """
+    Uncount a product of ``price`` that already left its shop and category.
+
+    The price range is only recomputed, by a subquery in the same UPDATE,
+    when the product held one of its bounds.
+    """
+    price = price_value(price)
+    for model, field in COUNTED:
+        pk = shop_id if field == 'shop' else category_id
+        if pk is None:
+            continue
+        model.objects.filter(pk=pk).update(
+            product_count=Greatest(F('product_count') - 1, 0),
+            min_price=Case(When(min_price__lt=price, then=F('min_price')),
+                           default=aggregate_subquery(field, Min('price'))),
+            max_price=Case(When(max_price__gt=price, then=F('max_price')),
+                           default=aggregate_subquery(field, Max('price'))),
+        )
+
+
+def rebuild_counters(shop_ids=None, category_ids=None):
+    """
+    Recompute the counters of the given shops and categories (all of them by
+    default) from their products, one UPDATE per model.
+    """
+    for model, field in COUNTED:
+        pks = shop_ids if field == 'shop' else category_ids
+        rows = model.objects.all() if pks is None else model.objects.filter(pk__in=pks)
+        rows.update(
+            product_count=Coalesce(aggregate_subquery(field, Count('pk')), 0),
+            min_price=aggregate_subquery(field, Min('price')),
+            max_price=aggregate_subquery(field, Max('price')),
+        )
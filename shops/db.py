@@ -0,0 +1,30 @@
+import django
+from django.db import connections
+
+
+def check_connections(**kwargs):
+    """
+    Close the persistent connections that went away (database restart,
+    idle timeout of a pooler) before the request uses them.
+
+    Backport of Django 4.1's CONN_HEALTH_CHECKS: only the connections whose
+    settings enable it are checked, once per request.
+    """
+    for connection in connections.all():
+        if (connection.connection is not None and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not connection.is_usable()):
+            connection.close()
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """Run the PRAGMAS of the connection's DATABASES entry on every new SQLite connection."""
+    pragmas = connection.settings_dict.get('PRAGMAS')
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+# Django 4.1 and later run the check themselves.
+NEEDS_HEALTH_CHECKS = django.VERSION < (4, 1)
@@ -0,0 +1,49 @@
+from django.conf import settings
+
+from shops.renderers import ORJSONRenderer
+
+
+def json_encoder():
+    """Encode one object the way the API's JSON renderer renders it."""
+    return ORJSONRenderer().render
+
+
+def iter_chunks(queryset, values):
+    """
+    Yield lists of serialized rows of ``queryset``, one per database chunk.
+
+    Rows come from ``queryset.iterator()``, so neither the queryset cache nor
+    the serialized list grows with the number of rows.
+    """
+    chunk_size = settings.CATALOG_EXPORT_CHUNK_SIZE
+    chunk = []
+    for row in values.prepare_queryset(queryset).iterator(chunk_size=chunk_size):
+        chunk.append(values.to_representation(row))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_ndjson(queryset, values, encode=None):
+    """Yield ``queryset`` as newline delimited JSON, one object per line."""
+    encode = encode or json_encoder()
+    for chunk in iter_chunks(queryset, values):
+        yield b''.join(encode(item) + b'\n' for item in chunk)
+
+
+def stream_json(queryset, values, encode=None):
+    """
+    Yield ``queryset`` as a JSON array.
+
+    The opening bracket goes out before the query runs, so clients get the
+    first bytes right away.
+    """
+    encode = encode or json_encoder()
+    yield b'['
+    separator = b''
+    for chunk in iter_chunks(queryset, values):
+        yield separator + b','.join(encode(item) for item in chunk)
+        separator = b','
+    yield b']'
@@ -0,0 +1,123 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Max, Min, Subquery, When
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from shops.counters import price_value
+from shops.models import Product, Shop, ShopCategorySummary
+
+GROUP_FIELDS = ('category', 'category__slug', 'category__name')
+
+
+def aggregate_groups(products):
+    """Number and price range of ``products`` per (shop, category), in one GROUP BY."""
+    return (products.order_by().values('shop', *GROUP_FIELDS)
+            .annotate(product_count=Count('pk'), min_price=Min('price'), max_price=Max('price')))
+
+
+def category_facets(slug):
+    """
+    Facets of the products of the shop ``slug`` per category, from the
+    summary table when SHOP_FACETS_SUMMARY is on (one row per category) or
+    aggregated from the products otherwise. One query either way.
+    """
+    if settings.SHOP_FACETS_SUMMARY:
+        groups = (ShopCategorySummary.objects.filter(shop__slug=slug, product_count__gt=0)
+                  .values(*GROUP_FIELDS, 'product_count', 'min_price', 'max_price'))
+    else:
+        groups = aggregate_groups(Product.objects.filter(shop__slug=slug))
+    return sorted(groups, key=lambda group: (group['category__name'] is None, group['category__name'] or ''))
+
+
+def shop_facets(slug, groups):
+    """The facets of the whole shop, derived from its per category ``groups``."""
+    return {
+        'shop': slug,
+        'product_count': sum(group['product_count'] for group in groups),
+        'min_price': min((group['min_price'] for group in groups), default=None),
+        'max_price': max((group['max_price'] for group in groups), default=None),
+        'categories': [{
+            'id': group['category'],
+            'slug': group['category__slug'],
+            'name': group['category__name'],
+            'product_count': group['product_count'],
+            'min_price': group['min_price'],
+            'max_price': group['max_price'],
+        } for group in groups],
+    }
+
+
+def group_subquery(shop_id, category_id, aggregate):
+    """``aggregate`` of the products of one (shop, category) group, as a subquery."""
+    products = Product.objects.filter(shop_id=shop_id, category_id=category_id).order_by().values('shop')
+    return Subquery(products.annotate(value=aggregate).values('value'))
+
+
+def count_summary(shop_id, category_id, *prices):
+    """
+    Count products of ``prices`` in the summary of their (shop, category)
+    group, in one UPDATE (an INSERT for the first products of the group).
+    """
+    low, high = price_value(min(prices)), price_value(max(prices))
+    summaries = ShopCategorySummary.objects.filter(shop_id=shop_id, category_id=category_id)
+    deltas = {
+        'product_count': F('product_count') + len(prices),
+        'min_price': Least(Coalesce('min_price', low), low),
+        'max_price': Greatest(Coalesce('max_price', high), high),
+    }
+    if summaries.update(**deltas):
+        return
+    try:
+        with transaction.atomic():
+            ShopCategorySummary.objects.create(shop_id=shop_id, category_id=category_id, product_count=len(prices),
+                                               min_price=min(prices), max_price=max(prices))
+    except IntegrityError:
+        # Another writer created the group first.
+        summaries.update(**deltas)
+
+
+def uncount_summary(shop_id, category_id, price):
+    """
+    Uncount a product of ``price`` that already left its (shop, category)
+    group. As for the counters, the price range is only recomputed when the
+    product held one of its bounds.
+    """
+    price = price_value(price)
+    ShopCategorySummary.objects.filter(shop_id=shop_id, category_id=category_id).update(
+        product_count=Greatest(F('product_count') - 1, 0),
+        min_price=Case(When(min_price__lt=price, then=F('min_price')),
+                       default=group_subquery(shop_id, category_id, Min('price'))),
+        max_price=Case(When(max_price__gt=price, then=F('max_price')),
+                       default=group_subquery(shop_id, category_id, Max('price'))),
+    )
+
+
+def refresh_summary(shop_id, category_id):
+    """
+    Recompute the summary of one (shop, category) group from its products,
+    for the saves whose previous values are unknown.
+
+    The shop row is locked first (the summary row may not exist yet), so
+    concurrent refreshes of its groups run one after the other and each
+    aggregates the products committed before it: the last write is never
+    computed from a stale count.
+    """
+    with transaction.atomic():
+        list(Shop.objects.select_for_update().filter(pk=shop_id).values_list('pk'))
+        group = Product.objects.filter(shop_id=shop_id, category_id=category_id).aggregate(
+            product_count=Count('pk'), min_price=Min('price'), max_price=Max('price'))
+        if not group['product_count']:
+            ShopCategorySummary.objects.filter(shop_id=shop_id, category_id=category_id).delete()
+            return
+        ShopCategorySummary.objects.update_or_create(shop_id=shop_id, category_id=category_id, defaults=group)
+
+
+def rebuild_summaries():
+    """Recompute every summary with one GROUP BY over the products; returns the number of groups."""
+    ShopCategorySummary.objects.all().delete()
+    summaries = ShopCategorySummary.objects.bulk_create(
+        ShopCategorySummary(shop_id=group['shop'], category_id=group['category'],
+                            product_count=group['product_count'], min_price=group['min_price'],
+                            max_price=group['max_price'])
+        for group in aggregate_groups(Product.objects.all()).iterator())
+    return len(summaries)
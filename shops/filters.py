@@ -0,0 +1,77 @@
+import sys
+from decimal import Decimal
+
+from rest_framework import serializers
+
+from shops.models import Product
+
+
+def prefix_range(prefix):
+    """
+    ``(low, high)`` bounds of the strings starting with ``prefix``.
+
+    LIKE 'prefix%' can not use a plain B-tree index on SQLite (case
+    insensitive LIKE) nor on Postgres (non C collations), a range can.
+    ``high`` is ``None`` when no string sorts after every match (a prefix of
+    U+10FFFF only), leaving the range open-ended.
+    """
+    # The last code point has no successor, it is dropped: every string
+    # starting with the shorter prefix and below its successor still matches.
+    stem = prefix.rstrip(chr(sys.maxunicode))
+    if not stem:
+        return prefix, None
+    following = ord(stem[-1]) + 1
+    if 0xD800 <= following <= 0xDFFF:
+        # Surrogates can not be encoded, U+D7FF is followed by U+E000.
+        following = 0xE000
+    return prefix, stem[:-1] + chr(following)
+
+
+class ProductFilterSerializer(serializers.Serializer):
+    """
+    Query parameters filtering the product lists.
+
+    Every accepted combination is served by an index: shop and category by
+    their (shop, name) and (category, name) indexes, name prefixes by the
+    (name, id) index and price ranges by (category, price). A price range
+    must therefore be narrowed to a shop or a category, it would scan the
+    whole catalog otherwise.
+    """
+    shop = serializers.SlugField(required=False)
+    category = serializers.SlugField(required=False)
+    name_prefix = serializers.CharField(required=False, max_length=100)
+    min_price = serializers.DecimalField(required=False, max_digits=10, decimal_places=2, min_value=Decimal('0'))
+    max_price = serializers.DecimalField(required=False, max_digits=10, decimal_places=2, min_value=Decimal('0'))
+
+    def validate(self, attrs):
+        if ('min_price' in attrs or 'max_price' in attrs) and not ('shop' in attrs or 'category' in attrs):
+            raise serializers.ValidationError('Price ranges must be narrowed with shop or category.')
+        if attrs.get('min_price', 0) > attrs.get('max_price', attrs.get('min_price', 0)):
+            raise serializers.ValidationError('min_price must not be greater than max_price.')
+        return attrs
+
+    def filter(self, queryset):
+        filters = self.validated_data
+        if 'shop' in filters:
+            queryset = queryset.filter(shop__slug=filters['shop'])
+        if 'category' in filters:
+            queryset = queryset.filter(category__slug=filters['category'])
+        if 'name_prefix' in filters:
+            low, high = prefix_range(filters['name_prefix'])
+            # The range uses the index, startswith keeps the match exact
+            # whatever the collation orders between the bounds.
+            queryset = queryset.filter(name__gte=low, name__startswith=filters['name_prefix'])
+            if high is not None:
+                queryset = queryset.filter(name__lt=high)
+        if 'min_price' in filters:
+            queryset = queryset.filter(price__gte=filters['min_price'])
+        if 'max_price' in filters:
+            queryset = queryset.filter(price__lte=filters['max_price'])
+        return queryset
+
+
+def filter_products(request, queryset=None):
+    """Filter ``queryset`` (all products by default) by the request's query parameters, or raise a 400."""
+    serializer = ProductFilterSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    return serializer.filter(Product.objects.all() if queryset is None else queryset)
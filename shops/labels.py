@@ -0,0 +1,164 @@
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image
+from django.conf import settings
+
+from shops.rendering import QR_CODE_OPTIONS, render_qr_code
+
+# A4 portrait, in points.
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 24
+FONT_SIZE = 9
+
+
+def pdf_string(text):
+    """Encode ``text`` as a PDF literal string for the WinAnsi encoded Helvetica font."""
+    encoded = text.encode('cp1252', 'replace')
+    return b'(' + encoded.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def fit(text, width):
+    # Helvetica glyphs average about half the font size.
+    max_chars = max(int(width / (FONT_SIZE * 0.5)), 4)
+    return text if len(text) <= max_chars else text[:max_chars - 3] + '...'
+
+
+def compose_label(product):
+    """
+    Prepare the label of ``product``: its QR code as a PDF image XObject and
+    its caption. Runs on the composition threads, so it must not touch the ORM.
+    """
+    if product.qr_code:
+        with product.qr_code.open('rb') as f:
+            img = Image.open(f)
+            img.load()
+    else:
+        img = Image.open(BytesIO(render_qr_code(product.qr_data)))
+    # The stored PNG draws every module as a box_size square; one pixel per
+    # module is enough, the PDF viewer scales it up.
+    box_size = QR_CODE_OPTIONS['box_size']
+    img = img.resize((img.width // box_size, img.height // box_size), Image.NEAREST)
+    if img.mode not in ('1', 'L'):
+        img = img.convert('L')
+    data = zlib.compress(img.tobytes())
+    image = (b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray '
+             b'/BitsPerComponent %d /Filter /FlateDecode /Length %d >>\nstream\n'
+             % (img.width, img.height, 1 if img.mode == '1' else 8, len(data))) + data + b'\nendstream'
+    return image, product.name, 'R$ %s' % product.price
+
+
+class PDFWriter:
+    """
+    Minimal PDF writer emitting objects as soon as they are complete.
+
+    The catalog and page tree reference pages written before them, so the
+    whole document is produced in a single pass.
+    """
+    CATALOG, PAGES, FONT = 1, 2, 3
+
+    def __init__(self):
+        self.offsets = {}
+        self.position = 0
+        self.next_number = 4
+        self.pages = []
+
+    def reserve(self):
+        number = self.next_number
+        self.next_number += 1
+        return number
+
+    def write(self, number, body):
+        self.offsets[number] = self.position
+        chunk = b'%d 0 obj\n' % number + body + b'\nendobj\n'
+        self.position += len(chunk)
+        return chunk
+
+    def header(self):
+        chunk = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+        self.position += len(chunk)
+        return chunk
+
+    def page(self, labels, columns, rows):
+        """Lay ``labels`` out on a ``columns`` x ``rows`` grid and return the page's objects."""
+        cell_width = (PAGE_WIDTH - 2 * MARGIN) / columns
+        cell_height = (PAGE_HEIGHT - 2 * MARGIN) / rows
+        caption_height = 2.5 * FONT_SIZE
+        size = min(cell_width, cell_height - caption_height) * 0.9
+        chunks, resources, content = [], [], []
+        for i, (image, name, price) in enumerate(labels):
+            number = self.reserve()
+            chunks.append(self.write(number, image))
+            resources.append(b'/Im%d %d 0 R' % (i, number))
+            left = MARGIN + (i % columns) * cell_width
+            top = PAGE_HEIGHT - MARGIN - (i // columns) * cell_height
+            x = left + (cell_width - size) / 2
+            y = top - size
+            content.append(b'q %.2f 0 0 %.2f %.2f %.2f cm /Im%d Do Q' % (size, size, x, y, i))
+            for line, text in enumerate((fit(name, cell_width), price)):
+                content.append(b'BT /F1 %d Tf %.2f %.2f Td %s Tj ET'
+                               % (FONT_SIZE, left + 4, y - (line + 1) * FONT_SIZE * 1.1, pdf_string(text)))
+        stream = zlib.compress(b'\n'.join(content))
+        contents = self.reserve()
+        chunks.append(self.write(contents, b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(stream)
+                                 + stream + b'\nendstream'))
+        page = self.reserve()
+        self.pages.append(page)
+        chunks.append(self.write(page, (
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R '
+            b'/Resources << /Font << /F1 %d 0 R >> /XObject << %s >> >> >>'
+        ) % (self.PAGES, PAGE_WIDTH, PAGE_HEIGHT, contents, self.FONT, b' '.join(resources))))
+        return b''.join(chunks)
+
+    def trailer(self):
+        kids = b' '.join(b'%d 0 R' % number for number in self.pages)
+        chunks = [
+            self.write(self.FONT, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+                                  b'/Encoding /WinAnsiEncoding >>'),
+            self.write(self.PAGES, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self.pages))),
+            self.write(self.CATALOG, b'<< /Type /Catalog /Pages %d 0 R >>' % self.PAGES),
+        ]
+        xref_position = self.position
+        size = self.next_number
+        xref = [b'xref\n0 %d\n' % size, b'0000000000 65535 f \n']
+        for number in range(1, size):
+            xref.append(b'%010d 00000 n \n' % self.offsets[number])
+        xref.append(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                    % (size, self.CATALOG, xref_position))
+        return b''.join(chunks + xref)
+
+
+def stream_labels(products, columns=3, rows=4):
+    """
+    Yield a PDF with the labels of ``products``, ``columns`` x ``rows`` per page.
+
+    Labels are composed on a thread pool, with a bounded number in flight, and
+    every page is yielded as soon as it is complete, so memory does not grow
+    with the number of products.
+    """
+    writer = PDFWriter()
+    per_page = columns * rows
+    workers = settings.LABEL_SHEET_WORKERS
+    yield writer.header()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='labels') as executor:
+        in_flight = deque()
+        page = []
+        for product in products:
+            in_flight.append(executor.submit(compose_label, product))
+            if len(in_flight) < max(2 * workers, per_page):
+                continue
+            page.append(in_flight.popleft().result())
+            if len(page) == per_page:
+                yield writer.page(page, columns, rows)
+                page = []
+        while in_flight:
+            page.append(in_flight.popleft().result())
+            if len(page) == per_page:
+                yield writer.page(page, columns, rows)
+                page = []
+        if page or not writer.pages:
+            yield writer.page(page, columns, rows)
+    yield writer.trailer()
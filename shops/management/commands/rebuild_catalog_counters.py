@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from shops.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the product counters and price ranges of every shop and category.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_counters()
+        self.stdout.write(self.style.SUCCESS('Rebuilt the shop and category product counters.'))
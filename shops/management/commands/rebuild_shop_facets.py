@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from shops.facets import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per category product summaries of every shop (SHOP_FACETS_SUMMARY).'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            groups = rebuild_summaries()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {groups} shop category summaries.'))
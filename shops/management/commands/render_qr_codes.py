@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from shops.models import Product
+from shops.rendering import render_product_qr_code
+
+
+class Command(BaseCommand):
+    help = 'Render the QR codes of products still pending or failed (e.g. after a restart lost the queue).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Render every product, not only the stale ones.')
+
+    def handle(self, *args, **options):
+        products = Product.objects.all()
+        if not options['all']:
+            products = products.exclude(qr_code_status=Product.QRCodeStatus.READY)
+        pks = list(products.values_list('pk', flat=True))
+        for pk in pks:
+            render_product_qr_code(pk)
+        self.stdout.write(self.style.SUCCESS(f'Rendered {len(pks)} QR codes.'))
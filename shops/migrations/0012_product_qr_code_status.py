@@ -0,0 +1,24 @@
+# Generated by Django 3.2.14 on 2026-10-18 15:21
+
+from django.db import migrations, models
+
+
+def mark_rendered_qr_codes_ready(apps, schema_editor):
+    Product = apps.get_model('shops', 'Product')
+    Product.objects.exclude(base_64_qr_code__isnull=True).exclude(base_64_qr_code='').update(qr_code_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0011_alter_shop_address'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='qr_code_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.RunPython(mark_rendered_qr_codes_ready, migrations.RunPython.noop),
+    ]
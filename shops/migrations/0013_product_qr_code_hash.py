@@ -0,0 +1,18 @@
+# Generated by Django 3.2.14 on 2026-10-18 15:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0012_product_qr_code_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='qr_code_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+    ]
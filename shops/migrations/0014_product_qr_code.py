@@ -0,0 +1,18 @@
+# Generated by Django 3.2.14 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0013_product_qr_code_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='qr_code',
+            field=models.FileField(blank=True, editable=False, null=True, upload_to='qr_codes/'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+import base64
+import hashlib
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import migrations
+
+# Snapshots of shops.rendering as of this migration, which must keep naming
+# the files the same whatever the render parameters become (error_correction
+# is qrcode.constants.ERROR_CORRECT_H).
+QR_CODE_OPTIONS = {
+    'version': 12,
+    'error_correction': 2,
+    'box_size': 10,
+    'border': 8,
+}
+
+
+def qr_code_key(data):
+    params = ','.join(f'{name}={value}' for name, value in sorted(QR_CODE_OPTIONS.items()))
+    return hashlib.sha256(f'{params}\n{data}'.encode('utf-8')).hexdigest()
+
+
+def qr_code_file_name(key):
+    return f'qr_codes/{key}.png'
+
+
+def base64_to_files(apps, schema_editor):
+    Product = apps.get_model('shops', 'Product')
+    products = Product.objects.exclude(base_64_qr_code__isnull=True).exclude(base_64_qr_code='')
+    rows = products.values_list('pk', 'name', 'price', 'description', 'base_64_qr_code')
+    for pk, name, price, description, encoded in rows.iterator():
+        # Named after the QR payload, like the files written by the render
+        # worker (the historical model has no Product.qr_data).
+        key = qr_code_key('Nome: %s,\nPreço: R$%s,\nDescrição: %s' % (name, price, description))
+        file_name = qr_code_file_name(key)
+        if not default_storage.exists(file_name):
+            saved_name = default_storage.save(file_name, ContentFile(base64.b64decode(encoded)))
+            if saved_name != file_name:
+                # Written concurrently, keep a single copy.
+                default_storage.delete(saved_name)
+        Product.objects.filter(pk=pk).update(qr_code=file_name, qr_code_hash=key)
+
+
+def files_to_base64(apps, schema_editor):
+    Product = apps.get_model('shops', 'Product')
+    products = Product.objects.exclude(qr_code__isnull=True).exclude(qr_code='')
+    for pk, name in products.values_list('pk', 'qr_code').iterator():
+        with default_storage.open(name, 'rb') as f:
+            encoded = base64.b64encode(f.read()).decode('ascii')
+        Product.objects.filter(pk=pk).update(base_64_qr_code=encoded)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0014_product_qr_code'),
+    ]
+
+    operations = [
+        migrations.RunPython(base64_to_files, files_to_base64),
+    ]
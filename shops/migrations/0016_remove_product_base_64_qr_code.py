@@ -0,0 +1,17 @@
+# Generated by Django 3.2.14 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0015_move_qr_codes_to_storage'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='product',
+            name='base_64_qr_code',
+        ),
+    ]
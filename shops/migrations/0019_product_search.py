@@ -0,0 +1,55 @@
+import unicodedata
+
+from django.db import migrations
+
+# Snapshots of shops.search as of this migration, which must keep creating
+# the same index whatever that module becomes.
+SEARCH_TABLE = 'shops_product_search'
+DOCUMENT = "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B')"
+
+
+def fold(text):
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def create_search_index(apps, schema_editor):
+    """Create the full-text index of the products on the databases that have one, and fill it."""
+    Product = apps.get_model('shops', 'Product')
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM pragma_compile_options WHERE compile_options = 'ENABLE_FTS5'")
+            if cursor.fetchone() is None:
+                # Without FTS5 the in-memory index is used.
+                return
+            cursor.execute(f'CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5('
+                           f'name, description, tokenize="unicode61 remove_diacritics 2")')
+            cursor.execute(f'INSERT INTO {SEARCH_TABLE} (rowid, name, description) '
+                           f"SELECT id, name, COALESCE(description, '') FROM {Product._meta.db_table}")
+        elif vendor == 'postgresql':
+            cursor.execute(f'CREATE TABLE {SEARCH_TABLE} ('
+                           f'product_id bigint PRIMARY KEY REFERENCES {Product._meta.db_table} (id) '
+                           f'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, document tsvector NOT NULL)')
+            cursor.execute(f'CREATE INDEX {SEARCH_TABLE}_document_idx ON {SEARCH_TABLE} USING gin (document)')
+            for pk, name, description in Product.objects.values_list('pk', 'name', 'description').iterator():
+                cursor.execute(
+                    f'INSERT INTO {SEARCH_TABLE} (product_id, document) VALUES (%s, {DOCUMENT})',
+                    [pk, fold(name), fold(description)])
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0018_product_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.14 on 2026-10-18 16:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max, Min
+
+
+def fill_summaries(apps, schema_editor):
+    Product = apps.get_model('shops', 'Product')
+    ShopCategorySummary = apps.get_model('shops', 'ShopCategorySummary')
+    groups = (Product.objects.order_by().values('shop', 'category')
+              .annotate(product_count=Count('pk'), min_price=Min('price'), max_price=Max('price')))
+    ShopCategorySummary.objects.bulk_create(
+        ShopCategorySummary(shop_id=group['shop'], category_id=group['category'],
+                            product_count=group['product_count'], min_price=group['min_price'],
+                            max_price=group['max_price'])
+        for group in groups.iterator())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0020_product_category_price_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopCategorySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shops.category')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_summaries', to='shops.shop')),
+            ],
+            options={
+                'verbose_name': 'Shop category summary',
+                'verbose_name_plural': 'Shop category summaries',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shopcategorysummary',
+            constraint=models.UniqueConstraint(fields=('shop', 'category'), name='shop_category_summary_unique'),
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.2.14 on 2026-10-18 16:04
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Product = apps.get_model('shops', 'Product')
+    for model_name, field in (('Shop', 'shop'), ('Category', 'category')):
+        products = Product.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+
+        def aggregate(function):
+            return Subquery(products.annotate(value=function).values('value'))
+
+        apps.get_model('shops', model_name).objects.update(
+            product_count=Coalesce(aggregate(Count('pk')), 0),
+            min_price=aggregate(Min('price')),
+            max_price=aggregate(Max('price')),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0021_shop_category_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='max_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='min_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='max_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='min_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
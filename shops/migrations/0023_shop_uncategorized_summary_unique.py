@@ -0,0 +1,17 @@
+# Generated by Django 3.2.14 on 2026-10-18 16:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0022_product_counters'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='shopcategorysummary',
+            constraint=models.UniqueConstraint(condition=models.Q(('category', None)), fields=('shop',), name='shop_uncategorized_summary_unique'),
+        ),
+    ]
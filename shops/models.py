@@ -1,20 +1,38 @@
-import base64
-from io import BytesIO
+import os
 
-import qrcode
 from autoslug import AutoSlugField
-from django.db import models
+from django.db import models, transaction
 
+from shops.rendering import enqueue_qr_code_render, qr_code_key
 from users.models import User
 
 
-class Shop(models.Model):
+class ProductCountersMixin:
+    """
+    Rows counting their products (``product_count``, ``min_price`` and
+    ``max_price``, maintained by ``shops.counters``).
+    """
+    COUNTER_FIELDS = ('product_count', 'min_price', 'max_price')
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args and kwargs.get('update_fields') is None:
+            # Counters are only written by F() updates, saving the copy loaded
+            # earlier would undo the ones made since.
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.COUNTER_FIELDS]
+        super().save(*args, **kwargs)
+
+
+class Shop(ProductCountersMixin, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
     slug = AutoSlugField(unique=True, always_update=False, populate_from='name')
     address = models.CharField(max_length=200)
     phone = models.CharField(max_length=20, blank=True, null=True)
     website = models.CharField(max_length=100, blank=True, null=True)
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, editable=False)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, editable=False)
 
     def __str__(self):
         return self.name
@@ -29,10 +47,13 @@ class Shop(models.Model):
 
 
 # create a model for categories
-class Category(models.Model):
+class Category(ProductCountersMixin, models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True, null=True)
     slug = AutoSlugField(unique=True, always_update=False, populate_from='name')
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, editable=False)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, editable=False)
 
     def __str__(self):
         return self.name
@@ -48,12 +69,19 @@ class Category(models.Model):
 
 # Create a model for products
 class Product(models.Model):
+    class QRCodeStatus(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        READY = 'ready', 'Ready'
+        FAILED = 'failed', 'Failed'
+
     shop = models.ForeignKey(Shop, on_delete=models.CASCADE)
     name = models.CharField(max_length=200)
     slug = AutoSlugField(unique=True, always_update=False, populate_from='name')
     price = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.TextField()
-    base_64_qr_code = models.TextField(blank=True, null=True)
+    qr_code = models.FileField(upload_to='qr_codes/', blank=True, null=True, editable=False)
+    qr_code_status = models.CharField(max_length=10, choices=QRCodeStatus.choices, default=QRCodeStatus.PENDING)
+    qr_code_hash = models.CharField(max_length=64, blank=True, null=True, editable=False)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, blank=True, null=True)
 
     def __str__(self):
@@ -63,24 +91,70 @@ class Product(models.Model):
         ordering = ('name',)
         verbose_name = 'Product'
         verbose_name_plural = 'Products'
+        indexes = [
+            # Product lists are always read in (name, pk) order, per shop,
+            # per category or across the catalog.
+            models.Index(fields=['shop', 'name'], name='product_shop_name_idx'),
+            models.Index(fields=['category', 'name'], name='product_category_name_idx'),
+            models.Index(fields=['name', 'id'], name='product_name_id_idx'),
+            # Price ranges within a category (?category=&max_price=).
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+        ]
 
     def get_absolute_url(self):
         return f'/{self.slug}/'
 
+    @property
+    def qr_code_etag(self):
+        # Stored images are named after a hash of their content.
+        return '"%s"' % os.path.splitext(os.path.basename(self.qr_code.name))[0]
+
+    @property
+    def qr_data(self):
+        return 'Nome: %s,\nPreço: R$%s,\nDescrição: %s' % (self.name, self.price, self.description)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The shop, category and price a product leaves on save are
+        # uncounted from the facet summaries and counters.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def save(self, *args, **kwargs):
-        fname = f'{self.name}.png'
-        buffer = BytesIO()
-        qr = qrcode.QRCode(
-            version=12,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-            box_size=10,
-            border=8
-        )
-        qr_data = 'Nome: %s,\nPreço: R$%s,\nDescrição: %s' % (self.name, self.price, self.description)
-        qr.add_data(qr_data)
-        qr.make()
-        qrcode_img = qr.make_image()
-        qrcode_img.save(buffer, format='PNG')
-        encoded = base64.b64encode(buffer.getvalue()).decode("ascii")
-        self.base_64_qr_code = encoded
-        super().save(*args, **kwargs)
+        if self.qr_code_status == self.QRCodeStatus.READY and self.qr_code_hash == qr_code_key(self.qr_data):
+            # Only fields outside the QR payload changed (e.g. category or shop).
+            super().save(*args, **kwargs)
+        else:
+            # The QR code is rendered in the background once the row is
+            # committed, until then the previous image (if any) is kept and
+            # flagged as stale.
+            self.qr_code_status = self.QRCodeStatus.PENDING
+            super().save(*args, **kwargs)
+            pk = self.pk
+            transaction.on_commit(lambda: enqueue_qr_code_render(pk), using=self._state.db)
+        # What the post_save receivers compare the next save against.
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
+
+
+class ShopCategorySummary(models.Model):
+    """
+    Number and price range of the products of a shop in a category (``None``
+    for the uncategorized ones), kept up to date by the Product signals when
+    SHOP_FACETS_SUMMARY is on.
+    """
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='category_summaries')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, blank=True, null=True, related_name='+')
+    product_count = models.PositiveIntegerField(default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'Shop category summary'
+        verbose_name_plural = 'Shop category summaries'
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'category'], name='shop_category_summary_unique'),
+            # NULLs are distinct in the constraint above: one uncategorized row per shop.
+            models.UniqueConstraint(fields=['shop'], condition=models.Q(category=None),
+                                    name='shop_uncategorized_summary_unique'),
+        ]
@@ -0,0 +1,134 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over the catalog's ``(name, pk)`` ordering.
+
+    Cursors hold the position of the last (or first, going backwards) row of
+    the page, and the next page is fetched with a ``WHERE (name, pk) > ...``
+    condition instead of an OFFSET, so every page costs the same as the first.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.cursor = self.decode_cursor(request)
+        reverse = False
+
+        queryset = queryset.order_by('name', 'pk')
+        if self.cursor is not None:
+            name, pk, reverse = self.cursor
+            if reverse:
+                queryset = queryset.filter(Q(name__lt=name) | Q(name=name, pk__lt=pk)).order_by('-name', '-pk')
+            else:
+                queryset = queryset.filter(Q(name__gt=name) | Q(name=name, pk__gt=pk))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, self.cursor is not None
+
+        self.next_position = self.previous_position = None
+        if results:
+            if has_next:
+                self.next_position = (results[-1].name, results[-1].pk, False)
+            if has_previous:
+                self.previous_position = (results[0].name, results[0].pk, True)
+        self.first_page_is_next = reverse and not results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        page_size = settings.CATALOG_PAGE_SIZE
+        if self.page_size_query_param in request.query_params:
+            try:
+                page_size = int(request.query_params[self.page_size_query_param])
+            except ValueError:
+                pass
+        return max(1, min(page_size, settings.CATALOG_MAX_PAGE_SIZE))
+
+    def get_next_link(self):
+        if self.first_page_is_next:
+            # Walked back past the start of the list, the next page is the first one.
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.next_position)
+
+    def get_previous_link(self):
+        return self.encode_cursor(self.previous_position)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            name, pk, reverse = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            return str(name), int(pk), bool(reverse)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        if position is None:
+            return None
+        encoded = base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_schema_fields(self, view):
+        return []
+
+
+class RankPagination(KeysetPagination):
+    """
+    Offset pagination over ranked search results.
+
+    A rank is no position to continue from, so pages are addressed by
+    ``?offset=``; the search backends only compute the requested window.
+    """
+    offset_query_param = 'offset'
+
+    def paginate_search(self, search, query, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        try:
+            self.offset = max(0, int(request.query_params.get(self.offset_query_param, 0)))
+        except ValueError:
+            self.offset = 0
+        results = search(query, self.page_size + 1, self.offset)
+        self.has_next = len(results) > self.page_size
+        return results[:self.page_size]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.offset_query_param,
+                                   self.offset + self.page_size)
+
+    def get_previous_link(self):
+        if not self.offset:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.offset <= self.page_size:
+            return remove_query_param(url, self.offset_query_param)
+        return replace_query_param(url, self.offset_query_param, self.offset - self.page_size)
@@ -0,0 +1,56 @@
+import threading
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+
+class QRCodeCache:
+    """
+    Rendered QR codes, kept in the media storage under their content address.
+
+    Names derive from hashes of the QR payload and render parameters (see
+    ``shops.rendering.qr_code_key``), so an entry never needs invalidation:
+    a different payload is simply a different name. The stored files are
+    shared by every process, and every lookup (render worker and bulk
+    imports alike) is counted here.
+    """
+
+    def __init__(self, storage=default_storage):
+        self.storage = storage
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def contains(self, name):
+        found = self.storage.exists(name)
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return found
+
+    def save(self, name, content):
+        """Store ``content`` under ``name``, which is returned as is."""
+        saved_name = self.storage.save(name, ContentFile(content))
+        if saved_name != name:
+            # Another writer stored it concurrently under the same content
+            # address, the storage picked a free name: keep a single copy.
+            self.storage.delete(saved_name)
+        return name
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'storage': self.storage.__class__.__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else None,
+        }
+
+
+_cache = QRCodeCache()
+
+
+def get_qr_code_cache():
+    return _cache
@@ -0,0 +1,170 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+
+import qrcode
+from PIL import Image
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections
+
+from shops.cache_tags import product_tags
+from shops.qr_cache import get_qr_code_cache
+from shops.response_cache import invalidate
+
+logger = logging.getLogger(__name__)
+
+QR_CODE_OPTIONS = {
+    'version': 12,
+    'error_correction': qrcode.constants.ERROR_CORRECT_H,
+    'box_size': 10,
+    'border': 8,
+}
+
+
+def qr_code_key(data):
+    """Content address of the QR code of ``data`` with the current render parameters."""
+    params = ','.join(f'{name}={value}' for name, value in sorted(QR_CODE_OPTIONS.items()))
+    return hashlib.sha256(f'{params}\n{data}'.encode('utf-8')).hexdigest()
+
+
+def qr_code_file_name(key):
+    return f'qr_codes/{key}.png'
+
+
+def render_qr_code(data):
+    """
+    Render ``data`` into a PNG QR code.
+
+    Kept free of any ORM access so it can run inside a worker process.
+    """
+    buffer = BytesIO()
+    qr = qrcode.QRCode(**QR_CODE_OPTIONS)
+    qr.add_data(data)
+    qr.make()
+    qrcode_img = qr.make_image()
+    qrcode_img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def render_qr_code_pdf(png):
+    """Convert the PNG QR code in the file ``png`` into a PDF."""
+    buffer = BytesIO()
+    Image.open(png).save(buffer, format='PDF')
+    return buffer.getvalue()
+
+
+def get_qr_code_pdf(product):
+    """
+    Return the storage name of the PDF version of the product's QR code.
+
+    The PDF is rendered on first use and stored next to the PNG, under the
+    same content address, so it is invalidated whenever the QR code changes.
+    """
+    name = '%s.pdf' % os.path.splitext(product.qr_code.name)[0]
+    if not default_storage.exists(name):
+        with product.qr_code.open('rb') as f:
+            get_qr_code_cache().save(name, render_qr_code_pdf(f))
+    return name
+
+
+def render_product_qr_code(pk, render=render_qr_code):
+    """
+    Render the QR code of the product ``pk`` and store it.
+
+    The payload is read from the current row, and the result is only written
+    back if the row still holds that payload, so a slow render can never
+    overwrite the QR code of a newer save. Images are stored under their
+    content address, so payloads already rendered (for this or any other
+    product) are reused from the storage.
+    """
+    from shops.models import Product
+
+    try:
+        product = Product.objects.get(pk=pk)
+    except Product.DoesNotExist:
+        return
+    unchanged = Product.objects.filter(
+        pk=pk, name=product.name, price=product.price, description=product.description)
+    key = qr_code_key(product.qr_data)
+    name = qr_code_file_name(key)
+    cache = get_qr_code_cache()
+    if not cache.contains(name):
+        try:
+            content = render(product.qr_data)
+        except Exception:
+            logger.exception('Failed to render the QR code of product %s', pk)
+            if unchanged.update(qr_code_status=Product.QRCodeStatus.FAILED):
+                invalidate(*product_tags(product.slug, product.shop.slug))
+            return
+        cache.save(name, content)
+    if unchanged.update(qr_code=name, qr_code_hash=key, qr_code_status=Product.QRCodeStatus.READY):
+        invalidate(*product_tags(product.slug, product.shop.slug))
+
+
+class SyncRenderQueue:
+    """Render QR codes inline, in the calling thread."""
+
+    def __init__(self, workers=None):
+        pass
+
+    def submit(self, pk):
+        render_product_qr_code(pk)
+
+
+class ThreadRenderQueue:
+    """Render QR codes on a pool of background threads."""
+
+    def __init__(self, workers):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='qr-render')
+
+    def submit(self, pk):
+        return self._executor.submit(self._run, pk)
+
+    def render(self, data):
+        return render_qr_code(data)
+
+    def _run(self, pk):
+        try:
+            render_product_qr_code(pk, render=self.render)
+        finally:
+            # Connections are per thread, this only closes the worker's own.
+            connections.close_all()
+
+
+class ProcessRenderQueue(ThreadRenderQueue):
+    """
+    Render QR codes on a pool of worker processes.
+
+    Threads still do the database work, only the image encoding is shipped to
+    the processes, so the GIL is not shared with the request threads.
+    """
+
+    def __init__(self, workers):
+        super().__init__(workers)
+        self._processes = ProcessPoolExecutor(max_workers=workers)
+
+    def render(self, data):
+        return self._processes.submit(render_qr_code, data).result()
+
+
+RENDER_QUEUE_BACKENDS = {
+    'sync': SyncRenderQueue,
+    'thread': ThreadRenderQueue,
+    'process': ProcessRenderQueue,
+}
+
+_queues = {}
+
+
+def get_render_queue():
+    backend = settings.QR_CODE_RENDER_BACKEND
+    if backend not in _queues:
+        _queues[backend] = RENDER_QUEUE_BACKENDS[backend](settings.QR_CODE_RENDER_WORKERS)
+    return _queues[backend]
+
+
+def enqueue_qr_code_render(pk):
+    get_render_queue().submit(pk)
@@ -0,0 +1,141 @@
+import functools
+import hashlib
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+
+class ResponseCacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'cache': settings.CATALOG_CACHE,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else None,
+        }
+
+
+stats = ResponseCacheStats()
+
+
+def get_cache():
+    return caches[settings.CATALOG_CACHE]
+
+
+def tag_key(tag):
+    return f'catalog:tag:{tag}'
+
+
+def new_version():
+    # Versions restart from the clock when evicted, never from a value an
+    # earlier ETag may have been built from.
+    return time.time_ns()
+
+
+def tag_versions(tags):
+    cache = get_cache()
+    keys = [tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = new_version()
+            cache.add(key, version, timeout=None)
+            versions[key] = cache.get(key, version)
+    return [versions[key] for key in keys]
+
+
+def bump(tags):
+    cache = get_cache()
+    for tag in tags:
+        try:
+            cache.incr(tag_key(tag))
+        except ValueError:
+            cache.add(tag_key(tag), new_version(), timeout=None)
+
+
+def invalidate(*tags):
+    """
+    Expire every cached response depending on one of ``tags``.
+
+    Tags are bumped right away and again once the transaction commits, so a
+    response rendered from the old rows in between can not stay cached.
+    """
+    bump(tags)
+    transaction.on_commit(lambda: bump(tags))
+
+
+def cache_response(*tags, expand=None):
+    """
+    Cache the rendered JSON of a read-only view for CATALOG_CACHE_TIMEOUT.
+
+    Responses are keyed by scheme, host, path, query parameters, media type
+    and the current version of ``tags``, which may refer to the URL kwargs
+    (``'product:{slug}'``) and are bumped on writes (``shops.cache_tags``).
+    ``expand`` maps the relations a view can embed with ``?expand=`` to
+    their own tags, only depended on when the relation is expanded.
+
+    The key doubles as the ETag of the response: a matching If-None-Match is
+    answered with 304 from the tag versions alone, without a query.
+    """
+    from shops.serializers import parse_expand
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != 'GET' or request.accepted_renderer.format != 'json':
+                return view(self, request, *args, **kwargs)
+            names = list(tags)
+            for relation in sorted(parse_expand(request).intersection(expand or {})):
+                names += expand[relation]
+            names = [tag.format(**kwargs) for tag in names]
+            query = urlencode(sorted(request.query_params.lists()), doseq=True)
+            versions = ','.join(f'{name}={version}' for name, version in zip(names, tag_versions(names)))
+            # The bodies hold absolute URLs (pagination links, QR code URLs),
+            # built from the scheme and host of the request.
+            digest = hashlib.sha256(
+                f'{request.scheme}://{request.get_host()}{request.path}?{query}|{request.accepted_media_type}|'
+                f'{versions}'.encode('utf-8')).hexdigest()
+            key = 'catalog:response:' + digest
+            etag = f'"{digest}"'
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return not_modified
+
+            cache = get_cache()
+            cached = cache.get(key)
+            stats.record(hit=cached is not None)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+                response['ETag'] = etag
+                return response
+
+            response = view(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+
+                def store(rendered):
+                    cache.set(key, (rendered.content, rendered['Content-Type']), settings.CATALOG_CACHE_TIMEOUT)
+                response.add_post_render_callback(store)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,227 @@
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+
+SEARCH_TABLE = 'shops_product_search'
+# Matches in the name weigh more than matches in the description.
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+
+def fold(text):
+    """Lowercase ``text`` and strip its accents: 'Pão de Açúcar' -> 'pao de acucar'."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text):
+    return re.findall(r'\w+', fold(text))
+
+
+class SQLiteSearchBackend:
+    """
+    SQLite FTS5 table, ``rowid`` being the product id.
+
+    The ``unicode61`` tokenizer folds accents (``remove_diacritics 2``), every
+    query term is matched as a prefix and results are ranked by BM25.
+    """
+
+    def index(self, pk, name, description):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [pk])
+            cursor.execute(f'INSERT INTO {SEARCH_TABLE} (rowid, name, description) VALUES (%s, %s, %s)',
+                           [pk, name, description or ''])
+
+    def remove(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [pk])
+
+    def search(self, query, limit, offset=0):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+                f'ORDER BY bm25({SEARCH_TABLE}, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT}), rowid LIMIT %s OFFSET %s',
+                [match, limit, offset])
+            return [pk for pk, in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    """
+    ``tsvector`` column with a GIN index, one row per product.
+
+    Documents are folded in Python and indexed with the ``simple``
+    configuration, so accents are folded without the ``unaccent`` extension;
+    the name is weighted A and the description B, and every query term is a
+    prefix (``term:*``). Results are ranked by ``ts_rank``.
+    """
+    DOCUMENT = "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B')"
+
+    def index(self, pk, name, description):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (product_id, document) VALUES (%s, {self.DOCUMENT}) '
+                f'ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document',
+                [pk, fold(name), fold(description)])
+
+    def remove(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE product_id = %s', [pk])
+
+    def search(self, query, limit, offset=0):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT product_id FROM {SEARCH_TABLE}, to_tsquery('simple', %s) query "
+                f"WHERE document @@ query "
+                f"ORDER BY ts_rank(document, query, 1) DESC, product_id LIMIT %s OFFSET %s",
+                [' & '.join(f'{token}:*' for token in tokens), limit, offset])
+            return [pk for pk, in cursor.fetchall()]
+
+
+class MemorySearchBackend:
+    """
+    Inverted index held by the process, for databases without full-text
+    search.
+
+    It is built from the database on the first search and kept up to date by
+    the signals of this process once transactions commit; writes made by
+    other processes are only seen after a restart. Documents must match every
+    query term as a prefix and are ranked by the TF-IDF of the matched terms.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        self.sorted_terms = None
+        self.built = False
+        self.lock = threading.RLock()
+
+    def build(self):
+        from shops.models import Product
+
+        with self.lock:
+            if self.built:
+                return
+            for pk, name, description in Product.objects.values_list('pk', 'name', 'description').iterator():
+                self.add(pk, name, description)
+            self.built = True
+
+    def add(self, pk, name, description):
+        weights = defaultdict(float)
+        for term in tokenize(name):
+            weights[term] += NAME_WEIGHT
+        for term in tokenize(description):
+            weights[term] += DESCRIPTION_WEIGHT
+        for term, weight in weights.items():
+            self.postings[term][pk] = weight
+        self.documents[pk] = set(weights)
+        self.sorted_terms = None
+
+    def index(self, pk, name, description):
+        with self.lock:
+            if self.built:
+                self.discard(pk)
+                self.add(pk, name, description)
+
+    def discard(self, pk):
+        for term in self.documents.pop(pk, ()):
+            postings = self.postings[term]
+            postings.pop(pk, None)
+            if not postings:
+                del self.postings[term]
+        self.sorted_terms = None
+
+    def remove(self, pk):
+        with self.lock:
+            self.discard(pk)
+
+    def expand(self, prefix):
+        """Indexed terms starting with ``prefix``."""
+        if self.sorted_terms is None:
+            self.sorted_terms = sorted(self.postings)
+        terms = []
+        for term in self.sorted_terms[bisect_left(self.sorted_terms, prefix):]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def search(self, query, limit, offset=0):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        self.build()
+        with self.lock:
+            total = len(self.documents)
+            scores = None
+            for token in tokens:
+                token_scores = defaultdict(float)
+                for term in self.expand(token):
+                    postings = self.postings[term]
+                    idf = math.log(1 + total / len(postings))
+                    for pk, weight in postings.items():
+                        token_scores[pk] = max(token_scores[pk], weight * idf)
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {pk: score + token_scores[pk] for pk, score in scores.items() if pk in token_scores}
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [pk for pk, score in ranked[offset:offset + limit]]
+
+
+SEARCH_BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+    'memory': MemorySearchBackend,
+}
+_backends = {}
+_lock = threading.Lock()
+
+
+def default_backend_name():
+    """The database's own full-text search when it has the index table, the in-memory index otherwise."""
+    if connection.vendor in SEARCH_BACKENDS and SEARCH_TABLE in connection.introspection.table_names():
+        return connection.vendor
+    return 'memory'
+
+
+def get_search_backend():
+    name = settings.PRODUCT_SEARCH_BACKEND
+    with _lock:
+        if name not in _backends:
+            backend_name = default_backend_name() if name == 'auto' else name
+            try:
+                _backends[name] = SEARCH_BACKENDS[backend_name]()
+            except KeyError:
+                raise ImproperlyConfigured(f'Unknown PRODUCT_SEARCH_BACKEND {name!r}.')
+        return _backends[name]
+
+
+def index_product(pk, name, description):
+    backend = get_search_backend()
+    if isinstance(backend, MemorySearchBackend):
+        # The process' index must not see rows that could still be rolled back.
+        transaction.on_commit(lambda: backend.index(pk, name, description))
+    else:
+        backend.index(pk, name, description)
+
+
+def remove_product(pk):
+    backend = get_search_backend()
+    if isinstance(backend, MemorySearchBackend):
+        transaction.on_commit(lambda: backend.remove(pk))
+    else:
+        backend.remove(pk)
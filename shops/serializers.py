@@ -1,41 +1,147 @@
+import base64
+from types import SimpleNamespace
+
 from django.contrib.auth import get_user_model
+from django.urls import reverse
 from rest_framework import serializers
 
 from shops.models import Category, Product, Shop
-from users.serializers import UserCreateSerializer
 
 User = get_user_model()
 
 
-class ShopSerializer(serializers.ModelSerializer):
+def parse_expand(request):
+    return {name.strip() for name in request.query_params.get('expand', '').split(',') if name.strip()}
+
+
+class ExpandableSerializerMixin:
+    """
+    Embed relations in place of their id when they are listed in ``?expand=``.
+
+    ``expandable_fields`` maps a relation of the model to the serializer that
+    embeds it. Views pass their queryset through ``prepare_queryset``, which
+    joins the expanded relations, or prefetches them along with the
+    many-to-many fields of their serializers, so a page costs the same number
+    of queries whatever its size. Embedded objects are not expanded further.
+    """
+    expandable_fields = {}
+
+    @classmethod
+    def expanded_fields(cls, expand):
+        return [name for name in cls.expandable_fields if name in expand]
+
+    @classmethod
+    def is_expanded(cls, expand):
+        return bool(cls.expanded_fields(expand))
+
+    @classmethod
+    def is_single(cls, name):
+        field = cls.Meta.model._meta.get_field(name)
+        return field.many_to_one or field.one_to_one
+
+    @classmethod
+    def prepare_queryset(cls, queryset, expand):
+        for name in cls.expanded_fields(expand):
+            if cls.is_single(name):
+                queryset = queryset.select_related(name)
+            else:
+                queryset = queryset.prefetch_related(name)
+            nested = cls.expandable_fields[name]().fields
+            queryset = queryset.prefetch_related(*[
+                f'{name}__{field_name}' for field_name, field in nested.items()
+                if isinstance(field, serializers.ManyRelatedField)
+            ])
+        return queryset
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        context = dict(self.context, expand=set())
+        for name in self.expanded_fields(self.context.get('expand', ())):
+            serializer_class = self.expandable_fields[name]
+            related = getattr(instance, name)
+            if not self.is_single(name):
+                data[name] = serializer_class(related.all(), many=True, context=context).data
+            elif related is not None:
+                data[name] = serializer_class(related, context=context).data
+            else:
+                data[name] = None
+        return data
+
+
+class ShopUserSerializer(serializers.ModelSerializer):
     class Meta:
-        model = Shop
-        fields = '__all__'
+        model = User
+        fields = ('id', 'username', 'name')
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ShopSerializer(ExpandableSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'user': ShopUserSerializer}
+
     class Meta:
-        model = Product
+        model = Shop
         fields = '__all__'
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(ExpandableSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
 
 
-class UserSerializer(serializers.ModelSerializer):
+class ProductSerializer(ExpandableSerializerMixin, serializers.ModelSerializer):
+    qr_code_url = serializers.SerializerMethodField()
+    expandable_fields = {'shop': ShopSerializer, 'category': CategorySerializer}
+
     class Meta:
-        model = User
-        fields = '__all__'
+        model = Product
+        exclude = ('qr_code',)
+        read_only_fields = ('qr_code_status',)
 
+    @classmethod
+    def is_expanded(cls, expand):
+        return super().is_expanded(expand) or 'qr' in expand
 
-class UserShopSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Shop
-        fields = '__all__'
+    def get_qr_code_url(self, instance):
+        url = reverse('product-qr-code-png', kwargs={'slug': instance.slug})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+    def compile_qr_code_url(self):
+        # Resolved once per list instead of once per row: the slug converter
+        # only matches URL safe characters, so it is pasted in unquoted.
+        prefix, _, suffix = self.get_qr_code_url(SimpleNamespace(slug='__slug__')).rpartition('__slug__')
+        return lambda row: prefix + row.slug + suffix
 
     def to_representation(self, instance):
-        self.fields['user'] = UserCreateSerializer(read_only=True)
-        return super(UserShopSerializer, self).to_representation(instance)
+        data = super().to_representation(instance)
+        # The image itself is only inlined on request (?expand=qr), it costs a
+        # storage read per product.
+        if 'qr' in self.context.get('expand', ()):
+            data['base_64_qr_code'] = None
+            if instance.qr_code:
+                with instance.qr_code.open('rb') as f:
+                    data['base_64_qr_code'] = base64.b64encode(f.read()).decode('ascii')
+        return data
+
+
+class CategoryFacetSerializer(serializers.Serializer):
+    id = serializers.IntegerField(allow_null=True)
+    slug = serializers.SlugField(allow_null=True)
+    name = serializers.CharField(allow_null=True)
+    product_count = serializers.IntegerField()
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+class ShopFacetsSerializer(serializers.Serializer):
+    shop = serializers.SlugField()
+    product_count = serializers.IntegerField()
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    categories = CategoryFacetSerializer(many=True)
+
+
+class UserSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = '__all__'
@@ -0,0 +1,103 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from shops.counters import count_product, rebuild_counters, uncount_product
+from shops.db import NEEDS_HEALTH_CHECKS, apply_pragmas, check_connections
+from shops.facets import count_summary, refresh_summary, uncount_summary
+from shops.models import Category, Product, Shop
+from shops.cache_tags import invalidate_counters, product_tags, shop_slugs, shop_tags, user_tags
+from shops.response_cache import invalidate
+from shops.search import index_product, remove_product
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=Shop)
+def invalidate_shop(sender, instance, **kwargs):
+    invalidate(*shop_tags(instance.slug, instance.user_id), f'shop-products:{instance.slug}')
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category(sender, instance, **kwargs):
+    invalidate('categories', f'category:{instance.slug}')
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product(sender, instance, **kwargs):
+    # The products of the shop it left, if moved, change too.
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    shop_ids = {instance.shop_id, loaded.get('shop_id', instance.shop_id)}
+    tags = set(product_tags(instance.slug))
+    tags.update(f'shop-products:{slug}' for slug in shop_slugs(shop_ids))
+    invalidate(*tags)
+
+
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, instance, **kwargs):
+    index_product(instance.pk, instance.name, instance.description)
+
+
+@receiver(post_delete, sender=Product)
+def remove_deleted_product(sender, instance, **kwargs):
+    remove_product(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def count_saved_product(sender, instance, created, **kwargs):
+    current = (instance.shop_id, instance.category_id, Decimal(str(instance.price)))
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    if created:
+        previous = None
+        count_product(*current)
+    elif all(name in loaded for name in ('shop_id', 'category_id', 'price')):
+        previous = (loaded['shop_id'], loaded['category_id'], Decimal(str(loaded['price'])))
+        if previous != current:
+            uncount_product(*previous)
+            count_product(*current)
+    else:
+        # Saved from an instance that was not loaded: what it replaced is unknown.
+        previous = None
+        rebuild_counters(shop_ids=[instance.shop_id], category_ids=[instance.category_id])
+
+    groups = {current[:2]} if previous is None else {current[:2], previous[:2]}
+    if previous != current:
+        invalidate_counters(shop_ids={shop_id for shop_id, _ in groups},
+                            category_ids={category_id for _, category_id in groups})
+    if settings.SHOP_FACETS_SUMMARY:
+        if created:
+            count_summary(*current)
+        elif previous is None:
+            refresh_summary(*current[:2])
+        elif previous != current:
+            uncount_summary(*previous)
+            count_summary(*current)
+
+
+@receiver(post_delete, sender=Product)
+def uncount_deleted_product(sender, instance, **kwargs):
+    uncount_product(instance.shop_id, instance.category_id, instance.price)
+    invalidate_counters(shop_ids=[instance.shop_id], category_ids=[instance.category_id])
+    if settings.SHOP_FACETS_SUMMARY:
+        uncount_summary(instance.shop_id, instance.category_id, instance.price)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user(sender, instance, update_fields=None, **kwargs):
+    # Logging in only touches last_login, which no catalog response shows.
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    tags = user_tags(instance.pk, list(Shop.objects.filter(user=instance.pk).values_list('slug', flat=True)))
+    if tags:
+        invalidate(*tags)
+
+
+connection_created.connect(apply_pragmas, dispatch_uid='shops.db.apply_pragmas')
+
+if NEEDS_HEALTH_CHECKS:
+    request_started.connect(check_connections, dispatch_uid='shops.db.check_connections')
@@ -1,10 +1,52 @@
-from rest_framework.test import APITestCase
+import asyncio
+import base64
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-from shops.models import Shop, Category
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase, APITransactionTestCase
+
+from shops.async_views import async_read_view
+from shops.bulk import import_products
+from shops.db import check_connections
+from shops.filters import prefix_range
+from shops.models import Shop, Category, Product, ShopCategorySummary
+from shops.qr_cache import get_qr_code_cache
+from shops.renderers import ORJSONParser, ORJSONRenderer
+from shops.search import MemorySearchBackend
+from shops.serializers import CategorySerializer, ProductSerializer, ShopSerializer
+from shops.values import ValuesSerializer
+from shops.views import ProductViewSet, ShopViewSet
 from users.models import User
 
 
-class CategoryTestCase(APITestCase):
+# The test transactions are only visible on their own connection, not on the
+# readonly alias mirroring it (see ReadDatabaseTestCase).
+@override_settings(CATALOG_READ_DATABASE='default')
+class CatalogTestCase(APITestCase):
+    def tearDown(self):
+        # Cached catalog responses would outlive the test database rollback.
+        cache.clear()
+        super().tearDown()
+
+
+class CategoryTestCase(CatalogTestCase):
 
     def setUp(self):
         self.commom_user = User.objects.create_user(
@@ -61,7 +103,29 @@ class CategoryTestCase(APITestCase):
         """
         response = self.client.get(self.base_url, format='json')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data), 0)
+        self.assertEqual(len(response.data['results']), 0)
+
+    def test_list_categories_paginated(self):
+        """
+        Ensure we can walk the categories page by page, in both directions.
+        """
+        for name in ['Drinks', 'Bakery', 'Drinks', 'Fruits', 'Bakery']:
+            Category.objects.create(name=name)
+        expected = list(Category.objects.order_by('name', 'pk').values_list('slug', flat=True))
+        seen = []
+        url = self.base_url + '?page_size=2'
+        while url:
+            response = self.client.get(url, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen += [category['slug'] for category in response.data['results']]
+            last_page = response.data
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+        response = self.client.get(last_page['previous'], format='json')
+        self.assertEqual([category['slug'] for category in response.data['results']], expected[2:4])
+        response = self.client.get(self.base_url + '?cursor=invalid', format='json')
+        self.assertEqual(response.status_code, 404)
 
     def test_retrieve_category(self):
         """
@@ -122,7 +186,7 @@ class CategoryTestCase(APITestCase):
         self.assertEqual(response.status_code, 403)
 
 
-class ShopTestCase(APITestCase):
+class ShopTestCase(CatalogTestCase):
     def setUp(self):
         self.commom_user = User.objects.create_user(
             username='testuser', password='a2d4g6j8', email='test@gmail.com')
@@ -166,6 +230,34 @@ class ShopTestCase(APITestCase):
         self.assertEqual(response.data['name'], 'Test Shop')
         self.assertEqual(response.data['user'], 3)
         self.assertEqual(response.data['address'], 'Test Address')
+        self.assertTrue(User.objects.get(username='Joabson').check_password('a2d4g6j8'))
+
+    def test_create_shop_with_invalid_shop(self):
+        """
+        Ensure an invalid shop payload creates neither the shop nor its user.
+        """
+        data = {
+            "user": {"name": "Test Shop", "username": "Joabson", "email": "joabsonlg917@gmail.com",
+                     "password": "a2d4g6j8"},
+            "address": "Test Address",
+            "phone": "9" * 30,
+        }
+        response = self.client.post(self.base_url, data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('phone', response.data)
+        self.assertFalse(User.objects.filter(username='Joabson').exists())
+        self.assertEqual(Shop.objects.count(), 0)
+
+    def test_create_shop_with_invalid_user(self):
+        """
+        Ensure an invalid user payload is rejected before anything is written.
+        """
+        response = self.client.post(self.base_url, {"user": {"username": "Joabson"}, "address": "Test"}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.data)
+        response = self.client.post(self.base_url, {"address": "Test Address"}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.filter(username='Joabson').exists())
 
     def test_list_shops(self):
         """
@@ -173,7 +265,7 @@ class ShopTestCase(APITestCase):
         """
         response = self.client.get(self.base_url, format='json')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data), 0)
+        self.assertEqual(len(response.data['results']), 0)
 
     def test_retrieve_shop(self):
         """
@@ -195,7 +287,49 @@ class ShopTestCase(APITestCase):
         url = '/api/v1/shops/{}/products'.format(response.data['slug'])
         response = self.client.get(url, format='json')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data), 0)
+        self.assertEqual(len(response.data['results']), 0)
+
+    def test_retrieve_products_shop_in_one_query(self):
+        """
+        Ensure the products of a shop, with their shop and category embedded, cost one query.
+        """
+        slug = self.create_shop().data['slug']
+        shop = Shop.objects.get(slug=slug)
+        category = Category.objects.create(name='Test Category')
+        for i in range(3):
+            Product.objects.create(name='Product %d' % i, description='Test', price='1.00', shop=shop,
+                                   category=category)
+        url = '/api/v1/shops/{}/products?expand=shop,category'.format(slug)
+        with self.assertNumQueries(1):
+            response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(response.data['results'][0]['shop']['slug'], slug)
+        self.assertEqual(response.data['results'][0]['category']['name'], 'Test Category')
+
+    def test_list_shops_expand_user_constant_queries(self):
+        """
+        Ensure expanding the users of a list of shops costs the same queries whatever its size.
+        """
+        def count_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(self.base_url + '?expand=user', format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['results'][0]['user']['username'], 'owner0')
+            shops = ShopSerializer.prepare_queryset(Shop.objects.all(), {'user'})
+            with CaptureQueriesContext(connection) as serializer_queries:
+                ShopSerializer(shops, many=True, context={'expand': {'user'}}).data
+            return len(response.data['results']), len(queries), len(serializer_queries)
+
+        for i in range(10):
+            user = User.objects.create_user(username='owner%d' % i, password='a2d4g6j8', email='%d@test.com' % i)
+            Shop.objects.create(name='Shop %d' % i, user=user)
+            if i == 1:
+                few = count_queries()
+        many = count_queries()
+        self.assertEqual((few[0], many[0]), (2, 10))
+        self.assertEqual(few[1:], many[1:])
 
     def test_retrieve_products_shop_with_invalid_slug(self):
         """
@@ -326,7 +460,20 @@ class ShopTestCase(APITestCase):
         self.assertEqual(response.status_code, 404)
 
 
-class ProductTestCase(APITestCase):
+class ProductTestCase(CatalogTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
     def setUp(self):
         self.user = User.objects.create_user(
             username='testuser', password='a2d4g6j8')
@@ -386,7 +533,29 @@ class ProductTestCase(APITestCase):
         """
         response = self.client.get(self.base_url, format='json')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data), 0)
+        self.assertEqual(len(response.data['results']), 0)
+
+    def test_list_products_expand_constant_queries(self):
+        """
+        Ensure expanding shops and categories of a list of products costs the same queries whatever its size.
+        """
+        def count_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(self.base_url + '?expand=shop,category', format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['results'][0]['shop']['name'], 'Test Shop')
+            self.assertEqual(response.data['results'][0]['category']['name'], 'Test Category')
+            return len(response.data['results']), len(queries)
+
+        for i in range(10):
+            Product.objects.create(name='Product %d' % i, description='Test', price='1.00', shop=self.shop,
+                                   category=self.category)
+            if i == 1:
+                few = count_queries()
+        many = count_queries()
+        self.assertEqual((few[0], many[0]), (2, 10))
+        self.assertEqual(few[1], many[1])
 
     def test_retrieve_product(self):
         """
@@ -491,3 +660,897 @@ class ProductTestCase(APITestCase):
         url = '/api/v1/products/invalid'
         response = self.client.delete(url, format='json', HTTP_AUTHORIZATION='JWT {}'.format(self.token))
         self.assertEqual(response.status_code, 404)
+
+    def test_create_product_marks_qr_code_pending(self):
+        """
+        Ensure the QR code is not rendered while the product is being saved.
+        """
+        response = self.create_product()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['qr_code_status'], 'pending')
+        self.assertNotIn('base_64_qr_code', response.data)
+        url = '/api/v1/products/{}/qr-code-png'.format(response.data['slug'])
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, 202)
+
+    @override_settings(QR_CODE_RENDER_BACKEND='sync')
+    def test_qr_code_rendered_after_commit(self):
+        """
+        Ensure the QR code is rendered once the product is committed.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.create_product()
+        product = Product.objects.get(slug=response.data['slug'])
+        self.assertEqual(product.qr_code_status, 'ready')
+        self.assertTrue(product.qr_code)
+        url = '/api/v1/products/{}/qr-code-png'.format(product.slug)
+        self.assertEqual(response.data['qr_code_url'], 'http://testserver' + url)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['ETag'], '"{}"'.format(product.qr_code_hash))
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'\x89PNG'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(QR_CODE_RENDER_BACKEND='sync')
+    def test_qr_code_pdf_rendered_once(self):
+        """
+        Ensure the PDF is rendered on first request and then served from the storage.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            slug = self.create_product().data['slug']
+        url = '/api/v1/products/{}/qr-code-pdf'.format(slug)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="{}.pdf"'.format(slug))
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        with mock.patch('shops.rendering.render_qr_code_pdf') as render:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+        render.assert_not_called()
+
+    @override_settings(QR_CODE_RENDER_BACKEND='sync')
+    def test_stale_render_does_not_overwrite_qr_code(self):
+        """
+        Ensure a render is discarded when the product changed in the meantime.
+        """
+        from shops.rendering import render_product_qr_code
+
+        response = self.create_product()
+        product = Product.objects.get(slug=response.data['slug'])
+        # A payload no other test renders, so the cache can not answer it.
+        Product.objects.filter(pk=product.pk).update(description='Rendered while being edited.')
+
+        def render_and_edit(data):
+            Product.objects.filter(pk=product.pk).update(name='Edited meanwhile')
+            return 'stale'
+
+        render_product_qr_code(product.pk, render=render_and_edit)
+        product.refresh_from_db()
+        self.assertEqual(product.qr_code_status, 'pending')
+        self.assertFalse(product.qr_code)
+
+    @override_settings(QR_CODE_RENDER_BACKEND='sync')
+    def test_update_outside_qr_payload_keeps_qr_code(self):
+        """
+        Ensure changing only the category does not render the QR code again.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.create_product()
+        url = '/api/v1/products/{}'.format(response.data['slug'])
+        other_category = Category.objects.create(name='Other Category')
+        data = {
+            'name': 'Test Product',
+            'description': 'This is a test product.',
+            'price': '10.00',
+            'shop': self.shop.id,
+            'category': other_category.id
+        }
+        with mock.patch('shops.models.enqueue_qr_code_render') as enqueue:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.put(url, data, format='json', HTTP_AUTHORIZATION='JWT {}'.format(self.token))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['qr_code_status'], 'ready')
+        enqueue.assert_not_called()
+
+    @override_settings(QR_CODE_RENDER_BACKEND='sync')
+    def test_identical_qr_payload_is_rendered_once(self):
+        """
+        Ensure products sharing a QR payload reuse the cached image.
+        """
+        from shops.rendering import render_product_qr_code
+
+        cache = get_qr_code_cache()
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.create_product()
+        second = self.create_product()
+        hits = cache.hits
+
+        def render(data):
+            self.fail('The QR code was rendered twice.')
+
+        render_product_qr_code(Product.objects.get(slug=second.data['slug']).pk, render=render)
+        self.assertEqual(cache.hits, hits + 1)
+        first = Product.objects.get(slug=first.data['slug'])
+        second = Product.objects.get(slug=second.data['slug'])
+        self.assertEqual(first.qr_code_hash, second.qr_code_hash)
+        self.assertEqual(first.qr_code.name, second.qr_code.name)
+
+    @override_settings(QR_CODE_RENDER_BACKEND='sync')
+    def test_list_products_expand_qr(self):
+        """
+        Ensure the QR code image is only inlined when requested.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_product()
+        response = self.client.get(self.base_url, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('base_64_qr_code', response.data['results'][0])
+        self.assertNotIn('qr_code', response.data['results'][0])
+        response = self.client.get(self.base_url + '?expand=qr', format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(base64.b64decode(response.data['results'][0]['base_64_qr_code']).startswith(b'\x89PNG'))
+
+    def test_bulk_create_products(self):
+        """
+        Ensure we can import many products at once, with per-row errors.
+        """
+        data = [
+            {'name': 'Bulk Product', 'description': 'First.', 'price': '1.00', 'shop': self.shop.id},
+            {'name': 'Bulk Product', 'description': 'Second.', 'price': '2.00', 'shop': self.shop.id,
+             'category': self.category.id},
+            {'name': 'Missing Price', 'description': 'Invalid.', 'shop': self.shop.id},
+            {'name': 'Unknown Shop', 'description': 'Invalid.', 'price': '3.00', 'shop': 99999},
+        ]
+        url = self.base_url + '/bulk'
+        with override_settings(BULK_IMPORT_RENDER_PROCESSES=2, BULK_IMPORT_INLINE_RENDERS=1,
+                               BULK_IMPORT_CHUNK_SIZE=3):
+            response = self.client.post(url, data, format='json', HTTP_AUTHORIZATION='JWT {}'.format(self.token))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [3, 4])
+        self.assertIn('price', response.data['errors'][0]['errors'])
+        self.assertIn('shop', response.data['errors'][1]['errors'])
+        products = Product.objects.filter(name='Bulk Product').order_by('price')
+        self.assertEqual([product.slug for product in products], ['bulk-product', 'bulk-product-2'])
+        self.assertEqual(products[1].category, self.category)
+        for product in products:
+            self.assertEqual(product.qr_code_status, 'ready')
+            self.assertTrue(product.qr_code)
+
+    @override_settings(BULK_IMPORT_RENDER_PROCESSES=0)
+    def test_bulk_create_renders_before_the_transaction(self):
+        """
+        Ensure bulk imports render every QR code before they open the transaction inserting the products.
+        """
+        from shops import bulk
+
+        depths = []
+        render_qr_codes, bulk_create = bulk.render_qr_codes, Product.objects.bulk_create
+
+        def render(products):
+            depths.append(('render', len(connection.savepoint_ids)))
+            render_qr_codes(products)
+
+        def insert(products):
+            depths.append(('insert', len(connection.savepoint_ids)))
+            return bulk_create(products)
+
+        rows = [{'name': f'Bulk Product {i}', 'description': 'Test.', 'price': '1.00', 'shop': self.shop.id}
+                for i in range(3)]
+        with mock.patch('shops.bulk.render_qr_codes', render), \
+                mock.patch.object(Product.objects, 'bulk_create', insert):
+            self.assertEqual(import_products(rows, chunk_size=2), (3, []))
+        outside = len(connection.savepoint_ids)
+        self.assertEqual(depths, [('render', outside), ('render', outside),
+                                  ('insert', outside + 1), ('insert', outside + 1)])
+
+    @override_settings(BULK_IMPORT_RENDER_PROCESSES=0)
+    def test_bulk_create_products_from_csv_and_ndjson(self):
+        """
+        Ensure bulk imports accept CSV and NDJSON bodies.
+        """
+        url = self.base_url + '/bulk'
+        self.create_product()
+        body = 'name,description,price,shop,category\nTest Product,From CSV.,5.00,{},\n'.format(self.shop.id)
+        response = self.client.post(url, body, content_type='text/csv',
+                                    HTTP_AUTHORIZATION='JWT {}'.format(self.token))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 1)
+        self.assertTrue(Product.objects.filter(slug='test-product-2', category=None).exists())
+        body = '{"name": "From NDJSON", "description": "Ok.", "price": "1.50", "shop": %d}\n\nnot json\n' % self.shop.id
+        response = self.client.post(url, body, content_type='application/x-ndjson',
+                                    HTTP_AUTHORIZATION='JWT {}'.format(self.token))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'][0]['row'], 2)
+        response = self.client.post(url, 'name\n', content_type='text/plain',
+                                    HTTP_AUTHORIZATION='JWT {}'.format(self.token))
+        self.assertEqual(response.status_code, 415)
+
+    def test_bulk_create_products_without_authentication(self):
+        """
+        Ensure we can't import products without authentication.
+        """
+        response = self.client.post(self.base_url + '/bulk', [], format='json')
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(QR_CODE_RENDER_BACKEND='sync')
+    def test_label_sheets(self):
+        """
+        Ensure we can download the labels of a shop or of some products as one PDF.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            slugs = [self.create_product().data['slug'] for _ in range(3)]
+        # Not rendered yet, its label is composed on the fly.
+        slugs.append(self.create_product().data['slug'])
+        response = self.client.get('/api/v1/shops/{}/labels?columns=2&rows=1'.format(self.shop.slug))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        content = b''.join(response.streaming_content)
+        self.assertTrue(content.startswith(b'%PDF-1.4'))
+        self.assertTrue(content.endswith(b'%%EOF\n'))
+        self.assertEqual(content.count(b'/Type /Page '), 2)
+        self.assertEqual(content.count(b'/Subtype /Image'), 4)
+        response = self.client.get('/api/v1/products/labels?products={}'.format(','.join(slugs[:3])))
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content)
+        self.assertEqual(content.count(b'/Type /Page '), 1)
+        self.assertEqual(content.count(b'/Subtype /Image'), 3)
+        response = self.client.get('/api/v1/shops/invalid/labels')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/api/v1/products/labels?products={}&columns=0'.format(slugs[0]))
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_products_filtered(self):
+        """
+        Ensure products can be filtered by shop, category, name prefix and price range.
+        """
+        other_category = Category.objects.create(name='Other Category')
+        for name, price, category in [('Arroz', '10.00', self.category), ('Feijão', '55.00', self.category),
+                                      ('Farinha', '30.00', other_category), ('Açúcar', '12.00', None)]:
+            Product.objects.create(name=name, description='Test', price=price, shop=self.shop, category=category)
+
+        def names(query):
+            response = self.client.get(self.base_url + query, format='json')
+            self.assertEqual(response.status_code, 200)
+            return [product['name'] for product in response.data['results']]
+
+        self.assertEqual(names('?category={}&max_price=50'.format(self.category.slug)), ['Arroz'])
+        self.assertEqual(names('?category={}&min_price=20'.format(self.category.slug)), ['Feijão'])
+        self.assertEqual(names('?shop={}&min_price=11&max_price=40'.format(self.shop.slug)), ['Açúcar', 'Farinha'])
+        self.assertEqual(names('?name_prefix=Fa'), ['Farinha'])
+        self.assertEqual(names('?name_prefix=F&category={}'.format(self.category.slug)), ['Feijão'])
+        self.assertEqual(names('?shop=invalid'), [])
+
+    def test_name_prefix_range_edges(self):
+        """
+        Ensure name prefix ranges skip code points without a successor.
+        """
+        self.assertEqual(prefix_range('Fa'), ('Fa', 'Fb'))
+        self.assertEqual(prefix_range('a\U0010ffff'), ('a\U0010ffff', 'b'))
+        self.assertEqual(prefix_range('\U0010ffff\U0010ffff'), ('\U0010ffff\U0010ffff', None))
+        self.assertEqual(prefix_range('a\ud7ff'), ('a\ud7ff', 'a\ue000'))
+        Product.objects.create(name='\U0010ffff', description='Test', price='1.00', shop=self.shop)
+        response = self.client.get(self.base_url + '?name_prefix=%F4%8F%BF%BF', format='json')
+        self.assertEqual([product['name'] for product in response.data['results']], ['\U0010ffff'])
+
+    def test_list_products_rejects_unindexed_filters(self):
+        """
+        Ensure price ranges over the whole catalog and invalid filters are rejected.
+        """
+        response = self.client.get(self.base_url + '?max_price=50', format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.base_url + '?category={}&min_price=20&max_price=10'.format(self.category.slug),
+                                   format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.base_url + '?shop={}&min_price=abc'.format(self.shop.slug), format='json')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(CATALOG_EXPORT_CHUNK_SIZE=2)
+    def test_export_products(self):
+        """
+        Ensure products are streamed as a JSON array and as NDJSON, with the list's representation.
+        """
+        for i in range(5):
+            Product.objects.create(name='Product %d' % i, description='Test', price='1.00', shop=self.shop,
+                                   category=self.category)
+        results = self.client.get(self.base_url, format='json').json()['results']
+
+        response = self.client.get(self.base_url + '/export.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), results)
+
+        response = self.client.get(self.base_url + '/export.ndjson?shop=' + self.shop.slug)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], results)
+
+        response = self.client.get(self.base_url + '/export.json?shop=invalid')
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), [])
+
+
+class QRCodeCacheTestCase(CatalogTestCase):
+
+    @override_settings(BULK_IMPORT_RENDER_PROCESSES=0)
+    def test_lookups_counted_for_bulk_imports(self):
+        """
+        Ensure the QR codes found in the media storage are counted, bulk imports included.
+        """
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        user = User.objects.create_user(username='testuser', password='a2d4g6j8')
+        shop = Shop.objects.create(name='Test Shop', user=user)
+        cache = get_qr_code_cache()
+        hits, misses = cache.hits, cache.misses
+        rows = [{'name': 'Bulk Product', 'description': 'Same.', 'price': '1.00', 'shop': shop.id}] * 2
+        with override_settings(MEDIA_ROOT=media_root):
+            import_products(rows)
+            import_products(rows)
+        # One lookup per distinct payload and import: rendered once, then found.
+        self.assertEqual((cache.hits - hits, cache.misses - misses), (1, 1))
+        self.assertEqual(cache.stats()['storage'], 'FileSystemStorage')
+
+    def test_racing_saves_keep_content_address(self):
+        """
+        Ensure a QR code stored concurrently by another writer keeps its content-addressed name.
+        """
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root):
+            cache = get_qr_code_cache()
+            # The first save plays the other writer, the second one races it.
+            self.assertEqual(cache.save('qr_codes/race.png', b'png'), 'qr_codes/race.png')
+            self.assertEqual(cache.save('qr_codes/race.png', b'png'), 'qr_codes/race.png')
+            self.assertEqual(os.listdir(os.path.join(media_root, 'qr_codes')), ['race.png'])
+
+    def test_stats_require_admin(self):
+        """
+        Ensure only admins can read the cache statistics.
+        """
+        response = self.client.get('/api/v1/stats/qr-code-cache', format='json')
+        self.assertEqual(response.status_code, 401)
+        admin = User.objects.create_user(username='adminuser', password='a2d4g6j8', is_staff=True)
+        self.client.force_authenticate(admin)
+        response = self.client.get('/api/v1/stats/qr-code-cache', format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hit_ratio', response.data)
+
+
+class ResponseCacheTestCase(CatalogTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='a2d4g6j8')
+        self.shop = Shop.objects.create(name='Test Shop', user=self.user)
+
+    def test_list_served_from_cache_until_write(self):
+        """
+        Ensure catalog lists are cached and expired when the model changes.
+        """
+        from shops.response_cache import stats
+
+        response = self.client.get('/api/v1/categories', format='json')
+        self.assertEqual(len(response.data['results']), 0)
+        hits = stats.hits
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/v1/categories', format='json')
+        self.assertEqual(stats.hits, hits + 1)
+        self.assertEqual(response.json()['results'], [])
+        category = Category.objects.create(name='Test Category')
+        response = self.client.get('/api/v1/categories', format='json')
+        self.assertEqual(len(response.data['results']), 1)
+        response = self.client.get('/api/v1/categories/{}'.format(category.slug), format='json')
+        self.assertEqual(response.data['name'], 'Test Category')
+        category.name = 'Renamed Category'
+        category.save()
+        response = self.client.get('/api/v1/categories/{}'.format(category.slug), format='json')
+        self.assertEqual(response.data['name'], 'Renamed Category')
+
+    def test_cache_keyed_by_query_params(self):
+        """
+        Ensure different query parameters are cached separately.
+        """
+        Shop.objects.create(name='Other Shop', user=self.user)
+        response = self.client.get('/api/v1/shops?page_size=1', format='json')
+        self.assertEqual(len(response.data['results']), 1)
+        response = self.client.get('/api/v1/shops?page_size=2', format='json')
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_cache_keyed_by_host_and_scheme(self):
+        """
+        Ensure absolute URLs cached for one host or scheme are not served to another.
+        """
+        Shop.objects.create(name='Other Shop', user=self.user)
+        with override_settings(ALLOWED_HOSTS=['testserver', 'example.com']):
+            response = self.client.get('/api/v1/shops?page_size=1', format='json')
+            self.assertTrue(response.json()['next'].startswith('http://testserver/'))
+            response = self.client.get('/api/v1/shops?page_size=1', format='json', HTTP_HOST='example.com')
+            self.assertTrue(response.json()['next'].startswith('http://example.com/'))
+            response = self.client.get('/api/v1/shops?page_size=1', format='json', secure=True)
+            self.assertTrue(response.json()['next'].startswith('https://testserver/'))
+
+    def test_product_write_expires_shop_products(self):
+        """
+        Ensure a new product shows up in its shop's cached product list.
+        """
+        url = '/api/v1/shops/{}/products'.format(self.shop.slug)
+        response = self.client.get(url, format='json')
+        self.assertEqual(len(response.data['results']), 0)
+        Product.objects.create(name='Test Product', description='Test', price='1.00', shop=self.shop)
+        response = self.client.get(url, format='json')
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_product_write_keeps_other_shops_cached(self):
+        """
+        Ensure a product write only expires the cached pages of its own shop.
+        """
+        from shops.response_cache import stats
+
+        other_shop = Shop.objects.create(name='Other Shop', user=self.user)
+        url = '/api/v1/shops/{}/products'.format(other_shop.slug)
+        self.client.get(url, format='json')
+        Product.objects.create(name='Test Product', description='Test', price='1.00', shop=self.shop)
+        hits = stats.hits
+        self.client.get(url, format='json')
+        self.assertEqual(stats.hits, hits + 1)
+
+    def test_expanded_relation_tags(self):
+        """
+        Ensure a user write only expires the cached shop pages expanding the user.
+        """
+        from shops.response_cache import stats
+
+        self.client.get('/api/v1/shops', format='json')
+        self.client.get('/api/v1/shops?expand=user', format='json')
+        self.user.name = 'Renamed User'
+        self.user.save()
+        hits = stats.hits
+        self.client.get('/api/v1/shops', format='json')
+        self.assertEqual(stats.hits, hits + 1)
+        response = self.client.get('/api/v1/shops?expand=user', format='json')
+        self.assertEqual(stats.hits, hits + 1)
+        self.assertEqual(response.json()['results'][0]['user']['name'], 'Renamed User')
+        # Users without a shop are embedded nowhere.
+        User.objects.create_user(username='otheruser', password='a2d4g6j8', email='other@test.com').save()
+        self.client.get('/api/v1/shops?expand=user', format='json')
+        self.assertEqual(stats.hits, hits + 2)
+
+
+class ConditionalGetTestCase(CatalogTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='a2d4g6j8')
+        self.shop = Shop.objects.create(name='Test Shop', user=self.user)
+        self.product = Product.objects.create(name='Test Product', description='Test', price='1.00', shop=self.shop)
+
+    def test_unchanged_list_not_modified(self):
+        """
+        Ensure an unchanged list answers If-None-Match with 304 and no serialization.
+        """
+        response = self.client.get('/api/v1/products', format='json')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/v1/products', format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Product.objects.create(name='Other Product', description='Test', price='2.00', shop=self.shop)
+        response = self.client.get('/api/v1/products', format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_changes_on_update_and_delete(self):
+        """
+        Ensure details and lists get a new ETag when rows are updated or deleted.
+        """
+        url = '/api/v1/products/{}'.format(self.product.slug)
+        etag = self.client.get(url, format='json')['ETag']
+        self.product.price = '3.00'
+        self.product.save()
+        response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['price'], '3.00')
+        other = Product.objects.create(name='Other Product', description='Test', price='2.00', shop=self.shop)
+        list_etag = self.client.get('/api/v1/shops/{}/products'.format(self.shop.slug), format='json')['ETag']
+        other.delete()
+        response = self.client.get('/api/v1/shops/{}/products'.format(self.shop.slug), format='json',
+                                   HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_expanded_user_etag(self):
+        """
+        Ensure shops embedding their user get a new ETag when the user changes.
+        """
+        url = '/api/v1/shops/{}?expand=user'.format(self.shop.slug)
+        etag = self.client.get(url, format='json')['ETag']
+        self.assertEqual(self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.user.name = 'Renamed User'
+        self.user.save()
+        response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user']['name'], 'Renamed User')
+
+
+class ValuesSerializerTestCase(CatalogTestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='testuser', password='a2d4g6j8')
+        shop = Shop.objects.create(name='Test Shop', user=user, address='Rua')
+        category = Category.objects.create(name='Test Category', description='Tests')
+        Product.objects.create(name='Test Product', description='Test', price='1.50', shop=shop, category=category)
+        Product.objects.create(name='Without Category', description='Test', price='2.00', shop=shop)
+        self.request = Request(APIRequestFactory().get('/api/v1/products'))
+
+    def test_same_output_as_serializers(self):
+        """
+        Ensure the value rows render to the same bytes as the model serializers.
+        """
+        for model, serializer_class in [(Shop, ShopSerializer), (Category, CategorySerializer),
+                                        (Product, ProductSerializer)]:
+            context = {'request': self.request, 'expand': set()}
+            queryset = model.objects.order_by('name', 'pk')
+            values = ValuesSerializer(serializer_class, context=context)
+            self.assertEqual(
+                JSONRenderer().render(values.serialize(values.prepare_queryset(queryset))),
+                JSONRenderer().render(serializer_class(queryset, many=True, context=context).data),
+            )
+
+
+class ORJSONRendererTestCase(CatalogTestCase):
+    data = OrderedDict([
+        ('price', Decimal('10.50')),
+        ('updated_at', datetime.datetime(2022, 7, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc)),
+        ('name', 'Pão de queijo\u2028'),
+        ('tags', ('a', 'b')),
+        ('nested', [OrderedDict([('id', 1), ('slug', None)])]),
+    ])
+
+    def test_same_bytes_as_json_renderer(self):
+        """
+        Ensure the orjson renderer writes the same bytes as DRF's JSONRenderer, with or without orjson.
+        """
+        expected = JSONRenderer().render(self.data)
+        self.assertEqual(ORJSONRenderer().render(self.data), expected)
+        with mock.patch('shops.renderers.orjson', None):
+            self.assertEqual(ORJSONRenderer().render(self.data), expected)
+
+    def test_parse(self):
+        """
+        Ensure the orjson parser reads JSON bodies and rejects invalid ones.
+        """
+        data = ORJSONParser().parse(BytesIO('{"name": "Pão", "price": "1.00"}'.encode('utf-8')))
+        self.assertEqual(data, {'name': 'Pão', 'price': '1.00'})
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(BytesIO(b'{"name": '))
+
+
+class SearchTestCase(CatalogTestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='testuser', password='a2d4g6j8')
+        self.shop = Shop.objects.create(name='Test Shop', user=user)
+        self.cheese_bread = Product.objects.create(name='Pão de Queijo', description='Assado na hora.', price='5.00',
+                                                   shop=self.shop)
+        self.coffee = Product.objects.create(name='Café Torrado', description='Vai bem com pão de queijo.',
+                                             price='20.00', shop=self.shop)
+        Product.objects.create(name='Suco de Laranja', description='Natural.', price='8.00', shop=self.shop)
+
+    def search(self, query):
+        response = self.client.get('/api/v1/products/search', {'q': query}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [product['slug'] for product in response.data['results']]
+
+    def test_search_ranks_folds_accents_and_prefixes(self):
+        """
+        Ensure search matches word prefixes without accents, ranking name matches first.
+        """
+        self.assertEqual(self.search('queijo'), [self.cheese_bread.slug, self.coffee.slug])
+        self.assertEqual(self.search('PAO QUEIJ'), [self.cheese_bread.slug, self.coffee.slug])
+        self.assertEqual(self.search('caf'), [self.coffee.slug])
+        self.assertEqual(self.search('chocolate'), [])
+        response = self.client.get('/api/v1/products/search', format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_index_follows_writes(self):
+        """
+        Ensure updated and deleted products are reindexed.
+        """
+        self.coffee.name = 'Café Moído'
+        self.coffee.save()
+        self.assertEqual(self.search('moido'), [self.coffee.slug])
+        self.assertEqual(self.search('torrado'), [])
+        self.cheese_bread.delete()
+        self.assertEqual(self.search('queijo'), [self.coffee.slug])
+
+    def test_search_paginated(self):
+        """
+        Ensure search results are paginated by offset.
+        """
+        response = self.client.get('/api/v1/products/search', {'q': 'queijo', 'page_size': 1}, format='json')
+        self.assertEqual([product['slug'] for product in response.data['results']], [self.cheese_bread.slug])
+        self.assertIsNone(response.data['previous'])
+        response = self.client.get(response.data['next'], format='json')
+        self.assertEqual([product['slug'] for product in response.data['results']], [self.coffee.slug])
+        self.assertIsNone(response.data['next'])
+
+    def test_memory_backend(self):
+        """
+        Ensure the in-memory index ranks, folds accents and matches prefixes like the database ones.
+        """
+        backend = MemorySearchBackend()
+        self.assertEqual(backend.search('queijo', 10), [self.cheese_bread.pk, self.coffee.pk])
+        self.assertEqual(backend.search('pao queij', 10), [self.cheese_bread.pk, self.coffee.pk])
+        backend.index(self.coffee.pk, 'Café Moído', '')
+        self.assertEqual(backend.search('caf', 10), [self.coffee.pk])
+        self.assertEqual(backend.search('queijo', 10), [self.cheese_bread.pk])
+        backend.remove(self.cheese_bread.pk)
+        self.assertEqual(backend.search('queijo', 10), [])
+
+
+class FacetsTestCase(CatalogTestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='testuser', password='a2d4g6j8')
+        self.shop = Shop.objects.create(name='Test Shop', user=user)
+        self.drinks = Category.objects.create(name='Drinks')
+        self.food = Category.objects.create(name='Food')
+        self.coffee = Product.objects.create(name='Coffee', description='Test', price='20.00', shop=self.shop,
+                                             category=self.drinks)
+        Product.objects.create(name='Juice', description='Test', price='8.00', shop=self.shop, category=self.drinks)
+        Product.objects.create(name='Bread', description='Test', price='5.00', shop=self.shop, category=self.food)
+        Product.objects.create(name='Bag', description='Test', price='2.50', shop=self.shop)
+        self.url = '/api/v1/shops/{}/facets'.format(self.shop.slug)
+
+    def assertFacets(self, data, expected):
+        self.assertEqual([(category['slug'], category['product_count'], category['min_price'], category['max_price'])
+                          for category in data['categories']], expected)
+        self.assertEqual(data['product_count'], sum(category[1] for category in expected))
+
+    def test_facets_from_one_group_by(self):
+        """
+        Ensure the facets of a shop are aggregated per category in one query.
+        """
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFacets(response.data, [('drinks', 2, '8.00', '20.00'), ('food', 1, '5.00', '5.00'),
+                                          (None, 1, '2.50', '2.50')])
+        self.assertEqual((response.data['min_price'], response.data['max_price']), ('2.50', '20.00'))
+        response = self.client.get('/api/v1/shops/invalid/facets', format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_facets_from_summary_table(self):
+        """
+        Ensure the summary table follows product writes and serves the same facets.
+        """
+        with override_settings(SHOP_FACETS_SUMMARY=True):
+            call_command('rebuild_shop_facets', stdout=StringIO())
+            self.coffee.category = self.food
+            self.coffee.save()
+            product = Product.objects.get(name='Juice')
+            product.price = '9.00'
+            product.save()
+            Product.objects.get(name='Bag').delete()
+            with self.assertNumQueries(1):
+                response = self.client.get(self.url, format='json')
+        self.assertFacets(response.data, [('drinks', 1, '9.00', '9.00'), ('food', 2, '5.00', '20.00')])
+        cache.clear()
+        response = self.client.get(self.url, format='json')
+        self.assertFacets(response.data, [('drinks', 1, '9.00', '9.00'), ('food', 2, '5.00', '20.00')])
+
+    @override_settings(SHOP_FACETS_SUMMARY=True, BULK_IMPORT_RENDER_PROCESSES=0)
+    def test_summary_deltas_match_rebuild(self):
+        """
+        Ensure the summary updated by deltas on every write matches a full rebuild.
+        """
+        from shops.facets import aggregate_groups
+
+        call_command('rebuild_shop_facets', stdout=StringIO())
+        tea = Category.objects.create(name='Tea')
+        Product.objects.create(name='Green Tea', description='Test', price='4.00', shop=self.shop, category=tea)
+        Product.objects.create(name='Box', description='Test', price='1.00', shop=self.shop)
+        self.coffee.category = None
+        self.coffee.save()
+        Product.objects.get(name='Bread').delete()
+        import_products([{'name': 'Cake', 'description': 'Test', 'price': '30.00', 'shop': self.shop.id,
+                          'category': self.food.id}] * 2)
+        summaries = sorted(ShopCategorySummary.objects.filter(product_count__gt=0)
+                           .values_list('category', 'product_count', 'min_price', 'max_price'),
+                           key=lambda summary: summary[0] or 0)
+        groups = sorted(((group['category'], group['product_count'], group['min_price'], group['max_price'])
+                         for group in aggregate_groups(Product.objects.all())),
+                        key=lambda group: group[0] or 0)
+        self.assertEqual(summaries, groups)
+        self.assertEqual(ShopCategorySummary.objects.filter(category=None).get().product_count, 3)
+
+
+class CountersTestCase(CatalogTestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='testuser', password='a2d4g6j8')
+        self.shop = Shop.objects.create(name='Test Shop', user=user)
+        self.drinks = Category.objects.create(name='Drinks')
+        self.food = Category.objects.create(name='Food')
+        self.coffee = Product.objects.create(name='Coffee', description='Test', price='20.00', shop=self.shop,
+                                             category=self.drinks)
+        Product.objects.create(name='Juice', description='Test', price='8.00', shop=self.shop, category=self.drinks)
+        Product.objects.create(name='Bread', description='Test', price='5.00', shop=self.shop, category=self.food)
+
+    def assertCounters(self, instance, expected):
+        instance.refresh_from_db()
+        self.assertEqual((instance.product_count, instance.min_price, instance.max_price),
+                         (expected[0],) + tuple(None if price is None else Decimal(price) for price in expected[1:]))
+
+    def test_counters_follow_product_writes(self):
+        """
+        Ensure the counters of shops and categories follow created, moved, repriced and deleted products.
+        """
+        self.assertCounters(self.shop, (3, '5.00', '20.00'))
+        self.assertCounters(self.drinks, (2, '8.00', '20.00'))
+        self.coffee.category = self.food
+        self.coffee.price = '3.00'
+        self.coffee.save()
+        self.assertCounters(self.shop, (3, '3.00', '8.00'))
+        self.assertCounters(self.drinks, (1, '8.00', '8.00'))
+        self.assertCounters(self.food, (2, '3.00', '5.00'))
+        Product.objects.get(name='Juice').delete()
+        self.assertCounters(self.drinks, (0, None, None))
+        self.assertCounters(self.shop, (2, '3.00', '5.00'))
+        # Saving a shop or a category loaded before does not undo its counters.
+        self.drinks.name = 'Beverages'
+        self.drinks.save()
+        self.shop.save()
+        self.assertCounters(self.shop, (2, '3.00', '5.00'))
+        self.assertEqual(Category.objects.get(pk=self.drinks.pk).name, 'Beverages')
+
+    def test_counters_listed_without_extra_queries(self):
+        """
+        Ensure shop and category lists show the counters, refreshed when products change.
+        """
+        # The page only, no query per shop.
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/v1/shops', format='json')
+        self.assertEqual((response.data['results'][0]['product_count'], response.data['results'][0]['min_price'],
+                          response.data['results'][0]['max_price']), (3, '5.00', '20.00'))
+        Product.objects.create(name='Tea', description='Test', price='30.00', shop=self.shop, category=self.drinks)
+        response = self.client.get('/api/v1/shops', format='json')
+        self.assertEqual(response.data['results'][0]['max_price'], '30.00')
+        response = self.client.get('/api/v1/categories/{}'.format(self.drinks.slug), format='json')
+        self.assertEqual((response.data['product_count'], response.data['max_price']), (3, '30.00'))
+
+    def test_rebuild_counters_command(self):
+        """
+        Ensure the rebuild command recomputes counters drifted by raw updates.
+        """
+        Shop.objects.update(product_count=0, min_price=None, max_price=None)
+        Product.objects.filter(name='Bread').update(price='1.00')
+        call_command('rebuild_catalog_counters', stdout=StringIO())
+        self.assertCounters(self.shop, (3, '1.00', '20.00'))
+        self.assertCounters(self.food, (1, '1.00', '1.00'))
+
+
+class AsyncReadViewTestCase(CatalogTestCase):
+    def view(self, request, *args, **kwargs):
+        return HttpResponse(threading.current_thread().name)
+
+    async def test_reads_run_on_the_read_pool(self):
+        """
+        Ensure async read views serve reads on the read pool and writes on Django's thread.
+        """
+        with override_settings(ASYNC_CATALOG_READS=True):
+            view = async_read_view(self.view)
+        self.assertTrue(asyncio.iscoroutinefunction(view))
+        response = await view(AsyncRequestFactory().get('/api/v1/products'))
+        self.assertTrue(response.content.startswith(b'catalog-read'))
+        response = await view(AsyncRequestFactory().post('/api/v1/products'))
+        self.assertFalse(response.content.startswith(b'catalog-read'))
+
+    def test_sync_views_without_async_reads(self):
+        """
+        Ensure the views are left as they are when ASYNC_CATALOG_READS is off.
+        """
+        view = self.view
+        self.assertIs(async_read_view(view), view)
+
+
+@override_settings(QR_CODE_RENDER_BACKEND='sync')
+class AsyncStreamingTestCase(APITransactionTestCase):
+    """Streaming reads under ASGI, on committed rows the read pool connections can see."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.media_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.media_override.enable()
+        user = User.objects.create_user(username='testuser', password='a2d4g6j8')
+        self.shop = Shop.objects.create(name='Test Shop', user=user)
+        for i in range(3):
+            Product.objects.create(name='Product %d' % i, description='Test', price='1.00', shop=self.shop)
+
+    def tearDown(self):
+        self.media_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        cache.clear()
+        super().tearDown()
+
+    async def get(self, view, url, **kwargs):
+        with override_settings(ASYNC_CATALOG_READS=True):
+            view = async_read_view(view)
+        response = await view(AsyncRequestFactory().get(url), **kwargs)
+        # Iterated on the event loop, as Django's ASGI handler does.
+        return response, b''.join(response)
+
+    async def test_export_under_asgi(self):
+        """
+        Ensure exports are served under ASGI without querying from the event loop.
+        """
+        response, content = await self.get(ProductViewSet.as_view({'get': 'export_json'}),
+                                           '/api/v1/products/export.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="products.json"')
+        self.assertEqual(len(json.loads(content)), 3)
+
+    async def test_labels_under_asgi(self):
+        """
+        Ensure label sheets are composed off the event loop under ASGI.
+        """
+        response, content = await self.get(ShopViewSet.as_view({'get': 'retrieve_labels'}),
+                                           '/api/v1/shops/{}/labels'.format(self.shop.slug), slug=self.shop.slug)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(int(response['Content-Length']), len(content))
+        self.assertEqual(content.count(b'/Subtype /Image'), 3)
+
+
+class DatabaseConnectionTestCase(CatalogTestCase):
+    def test_check_connections(self):
+        """
+        Ensure only the unusable reused connections with health checks on are closed.
+        """
+        broken = mock.Mock(connection=object(), settings_dict={'CONN_HEALTH_CHECKS': True})
+        broken.is_usable.return_value = False
+        healthy = mock.Mock(connection=object(), settings_dict={'CONN_HEALTH_CHECKS': True})
+        healthy.is_usable.return_value = True
+        unchecked = mock.Mock(connection=object(), settings_dict={'CONN_HEALTH_CHECKS': False})
+        unopened = mock.Mock(connection=None, settings_dict={'CONN_HEALTH_CHECKS': True})
+        with mock.patch('shops.db.connections') as connections:
+            connections.all.return_value = [broken, healthy, unchecked, unopened]
+            check_connections()
+        broken.close.assert_called_once_with()
+        healthy.close.assert_not_called()
+        unchecked.is_usable.assert_not_called()
+        unopened.is_usable.assert_not_called()
+
+
+class ReadDatabaseTestCase(APITransactionTestCase):
+    databases = {'default', 'readonly'}
+
+    def tearDown(self):
+        cache.clear()
+        super().tearDown()
+
+    def test_lists_read_from_the_readonly_alias(self):
+        """
+        Ensure catalog lists read from CATALOG_READ_DATABASE, whose connections can not write.
+        """
+        Category.objects.create(name='Drinks')
+        with override_settings(CATALOG_READ_DATABASE='readonly'), \
+                CaptureQueriesContext(connections['readonly']) as queries:
+            response = self.client.get('/api/v1/categories', format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([category['slug'] for category in response.data['results']], ['drinks'])
+        self.assertEqual(len(queries), 1)
+        with connections['readonly'].cursor() as cursor:
+            cursor.execute('PRAGMA query_only')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+        with self.assertRaises(OperationalError):
+            Category.objects.using('readonly').create(name='Food')
+
+    def test_wal_is_opt_in(self):
+        """
+        Ensure the checked-in database keeps its rollback journal unless WAL is asked for.
+        """
+        from config.settings.base import sqlite_pragmas
+
+        self.assertEqual(sqlite_pragmas()['journal_mode'], 'delete')
+        self.assertEqual(sqlite_pragmas()['synchronous'], 'full')
+        self.assertEqual(sqlite_pragmas(journal_mode='wal')['synchronous'], 'normal')
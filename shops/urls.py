@@ -1,45 +1,73 @@
 from django.urls import path
 
-from .views import ShopViewSet, CategoryViewSet, ProductViewSet
+from .async_views import async_read_view
+from .views import ShopViewSet, CategoryViewSet, ProductViewSet, StatsViewSet
 
 urlpatterns = [
-    path('shops', ShopViewSet.as_view({
+    path('shops', async_read_view(ShopViewSet.as_view({
         'get': 'list',
         'post': 'create'
-    })),
-    path('shops/<slug:slug>', ShopViewSet.as_view({
+    }))),
+    path('shops/<slug:slug>', async_read_view(ShopViewSet.as_view({
         'get': 'retrieve',
         'put': 'update',
         'delete': 'destroy'
-    })),
+    }))),
     path('shops/user/<int:user_id>', ShopViewSet.as_view({
         'get': 'retrieve_by_user'
     })),
     path('shops/<slug:slug>/products', ShopViewSet.as_view({
         'get': 'retrieve_products'
     })),
-    path('products', ProductViewSet.as_view({
+    path('shops/<slug:slug>/facets', ShopViewSet.as_view({
+        'get': 'retrieve_facets'
+    })),
+    path('shops/<slug:slug>/labels', async_read_view(ShopViewSet.as_view({
+        'get': 'retrieve_labels'
+    }))),
+    path('products', async_read_view(ProductViewSet.as_view({
         'get': 'list',
         'post': 'create'
+    }))),
+    path('products/bulk', ProductViewSet.as_view({
+        'post': 'bulk_create'
     })),
-    path('products/<slug:slug>', ProductViewSet.as_view({
+    path('products/search', ProductViewSet.as_view({
+        'get': 'search'
+    })),
+    path('products/export.json', async_read_view(ProductViewSet.as_view({
+        'get': 'export_json'
+    }))),
+    path('products/export.ndjson', async_read_view(ProductViewSet.as_view({
+        'get': 'export_ndjson'
+    }))),
+    path('products/labels', async_read_view(ProductViewSet.as_view({
+        'get': 'list_labels'
+    }))),
+    path('products/<slug:slug>', async_read_view(ProductViewSet.as_view({
         'get': 'retrieve',
         'put': 'update',
         'delete': 'destroy'
-    })),
-    path('products/<slug:slug>/qr-code-png', ProductViewSet.as_view({
+    }))),
+    path('products/<slug:slug>/qr-code-png', async_read_view(ProductViewSet.as_view({
         'get': 'retrieve_qr_code_png'
-    })),
-    path('products/<slug:slug>/qr-code-pdf', ProductViewSet.as_view({
+    })), name='product-qr-code-png'),
+    path('products/<slug:slug>/qr-code-pdf', async_read_view(ProductViewSet.as_view({
         'get': 'retrieve_qr_code_pdf'
-    })),
-    path('categories', CategoryViewSet.as_view({
+    }))),
+    path('categories', async_read_view(CategoryViewSet.as_view({
         'get': 'list',
         'post': 'create'
-    })),
-    path('categories/<slug:slug>', CategoryViewSet.as_view({
+    }))),
+    path('categories/<slug:slug>', async_read_view(CategoryViewSet.as_view({
         'get': 'retrieve',
         'put': 'update',
         'delete': 'destroy'
+    }))),
+    path('stats/qr-code-cache', StatsViewSet.as_view({
+        'get': 'qr_code_cache'
+    })),
+    path('stats/response-cache', StatsViewSet.as_view({
+        'get': 'response_cache'
     })),
 ]
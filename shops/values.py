@@ -0,0 +1,69 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from rest_framework import serializers
+from rest_framework.relations import PKOnlyObject
+
+
+class ValuesSerializer:
+    """
+    Read-only fast path of a ModelSerializer for list endpoints.
+
+    Rows are fetched with ``values_list(named=True)`` instead of model
+    instances, and turned into dicts by converters compiled once per response
+    from the serializer's own fields (and its ``compile_<field>()`` methods
+    for method fields), so the output is the same as
+    ``serializer_class(instances, many=True).data`` without instantiating a
+    model or resolving a field source per row and field.
+    """
+
+    def __init__(self, serializer_class, context=None):
+        serializer = serializer_class(context=context or {})
+        self.model = serializer_class.Meta.model
+        self.columns = []
+        self.converters = [(field.field_name, self.compile(field)) for field in serializer._readable_fields]
+        if 'pk' not in self.columns:
+            # Keyset pagination positions rows by their pk.
+            self.columns.append('pk')
+
+    def column(self, name):
+        if name not in self.columns:
+            self.columns.append(name)
+        return name
+
+    def compile(self, field):
+        if isinstance(field, serializers.SerializerMethodField):
+            # The serializer may compile the method for rows with a
+            # ``compile_<field>()``, otherwise the method gets the row, which
+            # has the attributes of the instance it reads.
+            compile_method = getattr(field.parent, f'compile_{field.field_name}', None)
+            return compile_method() if compile_method is not None else getattr(field.parent, field.method_name)
+        if len(field.source_attrs) != 1:
+            raise ImproperlyConfigured(f'{field.field_name} has a dotted source, it needs a model instance.')
+        name = self.column(field.source)
+        to_representation = field.to_representation
+        if isinstance(field, serializers.PrimaryKeyRelatedField):
+            # values_list() already holds the related pk.
+            wrap = PKOnlyObject
+        elif isinstance(field, serializers.RelatedField):
+            raise ImproperlyConfigured(f'{field.field_name} needs the related instance, not only its pk.')
+        else:
+            model_field = self.model._meta.get_field(field.source)
+            if isinstance(model_field, models.FileField):
+                def wrap(value):
+                    return model_field.attr_class(None, model_field, value)
+            else:
+                return lambda row: None if getattr(row, name) is None else to_representation(getattr(row, name))
+
+        def convert(row):
+            value = getattr(row, name)
+            return None if value is None else to_representation(wrap(value))
+        return convert
+
+    def prepare_queryset(self, queryset):
+        return queryset.values_list(*self.columns, named=True)
+
+    def to_representation(self, row):
+        return {name: convert(row) for name, convert in self.converters}
+
+    def serialize(self, rows):
+        return [self.to_representation(row) for row in rows]
@@ -1,55 +1,152 @@
-import base64
-from io import BytesIO
-
-from PIL import Image
+from django.conf import settings
 from django.contrib.auth.hashers import make_password
-from django.http import HttpResponse
-from rest_framework import status, viewsets
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import serializers, status, viewsets
 from rest_framework.permissions import IsAdminUser, AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from shops.bulk import import_products, iter_rows
+from shops.cache_tags import (EXPANDED_PRODUCT_TAGS, EXPANDED_SHOP_DETAIL_TAGS, EXPANDED_SHOP_TAGS,
+                              EXPANDED_USER_SHOP_TAGS)
+from shops.export import stream_json, stream_ndjson
+from shops.facets import category_facets, shop_facets
+from shops.filters import filter_products
+from shops.labels import stream_labels
 from shops.models import Category
 from shops.models import Product
 from shops.models import Shop
-from shops.serializers import ShopSerializer, CategorySerializer, ProductSerializer, UserSerializer
+from shops.pagination import KeysetPagination, RankPagination
+from shops.qr_cache import get_qr_code_cache
+from shops.rendering import get_qr_code_pdf
+from shops.response_cache import cache_response, stats as response_cache_stats
+from shops.search import get_search_backend
+from shops.serializers import (ShopSerializer, CategorySerializer, ProductSerializer, ShopFacetsSerializer,
+                               UserSerializer, parse_expand)
+from shops.values import ValuesSerializer
+
+
+def serializer_context(request):
+    return {'request': request, 'expand': parse_expand(request)}
+
+
+def paginated_list(request, view, queryset, serializer_class):
+    """
+    Serialize a page of a catalog list.
+
+    Pages without expansions are read as value rows by ``ValuesSerializer``,
+    skipping model instances; expanded ones go through the serializer. Both
+    read from CATALOG_READ_DATABASE.
+    """
+    context = serializer_context(request)
+    queryset = queryset.using(settings.CATALOG_READ_DATABASE)
+    paginator = KeysetPagination()
+    if serializer_class.is_expanded(context['expand']):
+        queryset = serializer_class.prepare_queryset(queryset, context['expand'])
+        page = paginator.paginate_queryset(queryset, request, view=view)
+        data = serializer_class(page, many=True, context=context).data
+    else:
+        values = ValuesSerializer(serializer_class, context=context)
+        page = paginator.paginate_queryset(values.prepare_queryset(queryset), request, view=view)
+        data = values.serialize(page)
+    return paginator.get_paginated_response(data)
+
+
+def export_response(request, queryset, serializer_class, stream, content_type, filename):
+    values = ValuesSerializer(serializer_class, context=serializer_context(request))
+    queryset = queryset.using(settings.CATALOG_READ_DATABASE).order_by('name', 'pk')
+    response = StreamingHttpResponse(stream(queryset, values), content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="' + filename + '"'
+    return response
+
+
+def qr_code_not_ready(product):
+    if product.qr_code_status == Product.QRCodeStatus.FAILED:
+        return Response({'qr_code_status': product.qr_code_status}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return Response({'qr_code_status': product.qr_code_status}, status=status.HTTP_202_ACCEPTED)
+
+
+def serve_stored_file(request, name, etag, content_type, filename=None):
+    """
+    Stream a file of the media storage, answering conditional requests.
+
+    FileResponse hands the file to the server's file wrapper (sendfile) when
+    it has one.
+    """
+    try:
+        last_modified = default_storage.get_modified_time(name).timestamp()
+    except NotImplementedError:
+        last_modified = None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = FileResponse(default_storage.open(name, 'rb'), content_type=content_type,
+                                as_attachment=filename is not None, filename=filename or '')
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+class LabelLayoutSerializer(serializers.Serializer):
+    columns = serializers.IntegerField(min_value=1, max_value=10, default=3)
+    rows = serializers.IntegerField(min_value=1, max_value=10, default=4)
+
+
+def label_sheet_response(request, products, filename):
+    layout = LabelLayoutSerializer(data=request.query_params)
+    layout.is_valid(raise_exception=True)
+    products = products.iterator(chunk_size=settings.LABEL_SHEET_CHUNK_SIZE)
+    response = StreamingHttpResponse(stream_labels(products, **layout.validated_data), content_type='application/pdf')
+    response['Content-Disposition'] = 'attachment; filename="' + filename + '"'
+    return response
 
 
 class ShopViewSet(viewsets.ViewSet):
     permission_classes_by_action = {'create': [AllowAny],
                                     'list': [AllowAny],
                                     'retrieve': [AllowAny],
+                                    'retrieve_labels': [AllowAny],
+                                    'retrieve_facets': [AllowAny],
                                     'update': [IsAuthenticated],
                                     'destroy': [IsAdminUser]}
 
+    @cache_response('shops', expand=EXPANDED_SHOP_TAGS)
     def list(self, request):
-        queryset = Shop.objects.all()
-        serializer = ShopSerializer(queryset, many=True)
-        return Response(serializer.data)
+        return paginated_list(request, self, Shop.objects.all(), ShopSerializer)
 
+    @cache_response('shop:{slug}', expand=EXPANDED_SHOP_DETAIL_TAGS)
     def retrieve(self, request, slug=None):
         try:
-            shop = Shop.objects.get(slug=slug)
-            serializer = ShopSerializer(shop)
+            context = serializer_context(request)
+            shop = ShopSerializer.prepare_queryset(Shop.objects.all(), context['expand']).get(slug=slug)
+            serializer = ShopSerializer(shop, context=context)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Shop.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
     def create(self, request):
-        shop = request.data
-        user = shop['user']
-        user['password'] = make_password(user['password'])
+        shop = request.data.copy()
+        user = shop.get('user')
+        if not isinstance(user, dict):
+            return Response({'user': ['Expected an object.']}, status=status.HTTP_400_BAD_REQUEST)
         user_serializer = UserSerializer(data=user)
-        if user_serializer.is_valid():
-            user_serializer.save()
-            shop['user'] = user_serializer.data['id']
-            shop['name'] = user_serializer.data['name']
-
-            serializer = ShopSerializer(data=shop)
-            if serializer.is_valid():
-                serializer.save()
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
+        if not user_serializer.is_valid():
+            return Response(user_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        shop['name'] = user_serializer.validated_data.get('name')
+        serializer = ShopSerializer(data=shop)
+        # The user is only created once both payloads are valid.
+        serializer.fields['user'] = serializers.PrimaryKeyRelatedField(read_only=True)
+        if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        return Response(user_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        # Hashed once both payloads are valid, outside of the transaction.
+        password = make_password(user_serializer.validated_data['password'])
+        with transaction.atomic():
+            user = user_serializer.save(password=password)
+            serializer.save(user=user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def update(self, request, slug=None):
         try:
@@ -70,22 +167,39 @@ class ShopViewSet(viewsets.ViewSet):
         except Shop.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
+    @cache_response('user-shop:{user_id}', expand=EXPANDED_USER_SHOP_TAGS)
     def retrieve_by_user(self, request, user_id=None):
         try:
-            shop = Shop.objects.get(user=user_id)
-            serializer = ShopSerializer(shop)
+            context = serializer_context(request)
+            shop = ShopSerializer.prepare_queryset(Shop.objects.all(), context['expand']).get(user=user_id)
+            serializer = ShopSerializer(shop, context=context)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Shop.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
+    @cache_response('shop-products:{slug}', expand={'shop': ('shop:{slug}',),
+                                                    'category': EXPANDED_PRODUCT_TAGS['category']})
     def retrieve_products(self, request, slug=None):
-        try:
-            shop = Shop.objects.get(slug=slug)
-            products = Product.objects.filter(shop=shop)
-            serializer = ProductSerializer(products, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except Shop.DoesNotExist:
+        # One query: the products are looked up through the shop's slug, and
+        # the shop is only checked for on its own when the page is empty.
+        response = paginated_list(request, self, Product.objects.filter(shop__slug=slug), ProductSerializer)
+        if (not response.data['results'] and 'cursor' not in request.query_params
+                and not Shop.objects.filter(slug=slug).exists()):
             return Response(status=status.HTTP_404_NOT_FOUND)
+        return response
+
+    @cache_response('shop-products:{slug}', 'categories')
+    def retrieve_facets(self, request, slug=None):
+        groups = category_facets(slug)
+        if not groups and not Shop.objects.filter(slug=slug).exists():
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        return Response(ShopFacetsSerializer(shop_facets(slug, groups)).data, status=status.HTTP_200_OK)
+
+    def retrieve_labels(self, request, slug=None):
+        if not Shop.objects.filter(slug=slug).exists():
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        products = Product.objects.filter(shop__slug=slug).order_by('name', 'pk')
+        return label_sheet_response(request, products, slug + '-labels.pdf')
 
     def get_permissions(self):
         try:
@@ -96,37 +210,72 @@ class ShopViewSet(viewsets.ViewSet):
 
 class ProductViewSet(viewsets.ViewSet):
     permission_classes_by_action = {'create': [IsAuthenticated],
+                                    'bulk_create': [IsAuthenticated],
                                     'list': [AllowAny],
                                     'retrieve': [AllowAny],
                                     'retrieve_qr_code_png': [AllowAny],
                                     'retrieve_qr_code_pdf': [AllowAny],
+                                    'list_labels': [AllowAny],
+                                    'search': [AllowAny],
+                                    'export_json': [AllowAny],
+                                    'export_ndjson': [AllowAny],
                                     'update': [IsAuthenticated],
                                     'destroy': [IsAuthenticated]}
 
+    @cache_response('products', expand=EXPANDED_PRODUCT_TAGS)
     def list(self, request):
-        queryset = Product.objects.all()
-        serializer = ProductSerializer(queryset, many=True)
-        return Response(serializer.data)
+        return paginated_list(request, self, filter_products(request), ProductSerializer)
 
+    @cache_response('product:{slug}', expand=EXPANDED_PRODUCT_TAGS)
     def retrieve(self, request, slug=None):
         try:
-            product = Product.objects.get(slug=slug)
-            serializer = ProductSerializer(product)
+            context = serializer_context(request)
+            product = ProductSerializer.prepare_queryset(Product.objects.all(), context['expand']).get(slug=slug)
+            serializer = ProductSerializer(product, context=context)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Product.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
+    @cache_response('products', expand=EXPANDED_PRODUCT_TAGS)
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'q': ['This query parameter is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        paginator = RankPagination()
+        pks = paginator.paginate_search(get_search_backend().search, query, request)
+        context = serializer_context(request)
+        products = Product.objects.filter(pk__in=pks)
+        if ProductSerializer.is_expanded(context['expand']):
+            products = ProductSerializer.prepare_queryset(products, context['expand']).in_bulk()
+            data = ProductSerializer([products[pk] for pk in pks if pk in products], many=True, context=context).data
+        else:
+            values = ValuesSerializer(ProductSerializer, context=context)
+            rows = {row.pk: row for row in values.prepare_queryset(products)}
+            # Back in rank order.
+            data = [values.to_representation(rows[pk]) for pk in pks if pk in rows]
+        return paginator.get_paginated_response(data)
+
     def create(self, request):
-        serializer = ProductSerializer(data=request.data)
+        serializer = ProductSerializer(data=request.data, context=serializer_context(request))
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def bulk_create(self, request):
+        created, errors = import_products(iter_rows(request), context=serializer_context(request))
+        data = {
+            'created': created,
+            'errors': [{'row': row, 'errors': row_errors} for row, row_errors in errors],
+        }
+        if errors and not created:
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data, status=status.HTTP_201_CREATED)
+
     def update(self, request, slug=None):
         try:
             product = Product.objects.get(slug=slug)
-            serializer = ProductSerializer(product, data=request.data)
+            serializer = ProductSerializer(product, data=request.data, context=serializer_context(request))
             if serializer.is_valid():
                 serializer.save()
                 return Response(serializer.data, status=status.HTTP_200_OK)
@@ -145,23 +294,40 @@ class ProductViewSet(viewsets.ViewSet):
     def retrieve_qr_code_png(self, request, slug=None):
         try:
             product = Product.objects.get(slug=slug)
-            return Response("data:image/png;base64, " + product.base_64_qr_code)
+            if not product.qr_code:
+                return qr_code_not_ready(product)
+            return serve_stored_file(request, product.qr_code.name, product.qr_code_etag, 'image/png')
         except Product.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
     def retrieve_qr_code_pdf(self, request, slug=None):
         try:
             product = Product.objects.get(slug=slug)
-            pdf = BytesIO()
-            img = Image.open(BytesIO(base64.b64decode(product.base_64_qr_code)))
-            img.save(pdf, format='PDF')
-            pdf.seek(0)
-            response = HttpResponse(pdf.read(), content_type='application/pdf')
-            response['Content-Disposition'] = 'attachment; filename="' + product.slug + '.pdf"'
-            return response
+            if not product.qr_code:
+                return qr_code_not_ready(product)
+            # Rendered once per QR code and kept in the storage, not per request.
+            name = get_qr_code_pdf(product)
+            etag = '"%s-pdf"' % product.qr_code_etag.strip('"')
+            return serve_stored_file(request, name, etag, 'application/pdf', filename=product.slug + '.pdf')
         except Product.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
+    def export_json(self, request):
+        return export_response(request, filter_products(request), ProductSerializer, stream_json,
+                               'application/json', 'products.json')
+
+    def export_ndjson(self, request):
+        return export_response(request, filter_products(request), ProductSerializer, stream_ndjson,
+                               'application/x-ndjson', 'products.ndjson')
+
+    def list_labels(self, request):
+        slugs = [slug for slug in request.query_params.get('products', '').split(',') if slug]
+        if not slugs:
+            return Response({'products': ['Provide a comma separated list of product slugs.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        products = Product.objects.filter(slug__in=slugs).order_by('name', 'pk')
+        return label_sheet_response(request, products, 'labels.pdf')
+
     def get_permissions(self):
         try:
             return [permission() for permission in self.permission_classes_by_action[self.action]]
@@ -179,11 +345,11 @@ class CategoryViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         return CategorySerializer
 
+    @cache_response('categories', 'category-counts')
     def list(self, request):
-        categories = Category.objects.all()
-        serializer = CategorySerializer(categories, many=True)
-        return Response(serializer.data)
+        return paginated_list(request, self, Category.objects.all(), CategorySerializer)
 
+    @cache_response('category:{slug}')
     def retrieve(self, request, slug=None):
         try:
             category = Category.objects.get(slug=slug)
@@ -223,3 +389,13 @@ class CategoryViewSet(viewsets.ModelViewSet):
             return [permission() for permission in self.permission_classes_by_action[self.action]]
         except KeyError:
             return [permission() for permission in self.permission_classes]
+
+
+class StatsViewSet(viewsets.ViewSet):
+    permission_classes = [IsAdminUser]
+
+    def qr_code_cache(self, request):
+        return Response(get_qr_code_cache().stats())
+
+    def response_cache(self, request):
+        return Response(response_cache_stats.as_dict())